@@ -2,7 +2,6 @@
 
 import streamlit as st
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import logging
@@ -10,11 +9,9 @@ import os
 import io
 
 # Import modul lokal dari folder src
-from src.data_loader import load_local_data
-from src.preprocessing import clean_and_handle_missing_values
-from src.feature_engineering import create_features
-from src.modelling import build_hybrid_model, calculate_evaluation_metrics
+from src.model_store import artifact_version, load_or_build_artifact
 from src.integratedRecommender import IntegratedRecommender
+from src.recommendation_cache import RecommendationCache
 from src.evaluasiLlm import LLMTools, HybridEvaluation
 from src.visualisasi import run_eda # Kita akan modifikasi run_eda untuk Streamlit
 
@@ -64,33 +61,29 @@ def initialize_system():
     try:
         st.info("🚀 Menginisialisasi Sistem Rekomendasi...")
         
-        # 1. Load Data
-        df = load_local_data(DATA_FILE_PATH)
-        if df.empty:
-            st.error("Gagal memuat data. Pastikan 'data/product_data.csv' ada.")
-            return None, None, None, None
-
-        # 2. Preprocessing & Feature Engineering
-        df = clean_and_handle_missing_values(df)
-        df, tfidf_matrix = create_features(df)
-        
-        # 3. Modelling & Metrics
-        hybrid_sim = build_hybrid_model(df, tfidf_matrix)
-        metrics = calculate_evaluation_metrics(df, hybrid_sim)
+        # 1. Load artefak model (pipeline hanya dijalankan ulang jika versi data berubah)
+        artifact = load_or_build_artifact(DATA_FILE_PATH)
         
-        # 4. LLM & Recommender Setup
+        # 2. LLM & Recommender Setup
         llm_tools = LLMTools()
-        recommender = IntegratedRecommender(df, hybrid_sim)
+        recommender = IntegratedRecommender.from_artifact(artifact)
+        # Query identik dari banyak user dilayani dari cache; versi data dicek berkala dan recommender
+        # diganti (cache dikosongkan) saat CSV berubah
+        recommender = RecommendationCache(
+            recommender,
+            version_source=lambda: artifact_version(DATA_FILE_PATH),
+            loader=lambda version: IntegratedRecommender.from_artifact(load_or_build_artifact(DATA_FILE_PATH)),
+        )
         
         st.success("✅ Sistem Berhasil Diinisialisasi!")
-        return df, recommender, llm_tools, metrics
+        return recommender, llm_tools
         
     except EnvironmentError as e:
         st.error(f"❌ Error Inisialisasi LLM: {e}")
-        return None, None, None, None
+        return None, None
     except Exception as e:
         st.error(f"❌ Error Sistem: {e}")
-        return None, None, None, None
+        return None, None
 
 # --- Main Streamlit App ---
 
@@ -105,10 +98,14 @@ def main_app():
     st.markdown("Sistem rekomendasi produk berbasis konten, popularitas, dan didukung oleh interpretasi query LLM (Gemini).")
 
     # Inisialisasi Sistem
-    df, recommender, llm_tools, metrics = initialize_system()
+    recommender, llm_tools = initialize_system()
 
     if recommender is None:
         return # Hentikan jika inisialisasi gagal
+
+    # Katalog & metrik dibaca dari recommender aktif per render (bisa berganti saat versi artefak berubah)
+    live = recommender.current()
+    df, metrics = live.df, live.metrics
         
     # --- Sidebar for Metrics & Info ---
     with st.sidebar:
@@ -134,15 +131,20 @@ def main_app():
         
         with st.spinner(f"Mencari rekomendasi untuk '{product_query}'..."):
             
-            # 1. Interpretasi Query (Jika diaktifkan)
-            interpreted = product_query
-            if use_llm and llm_tools:
-                st.info(f"Input User: **{product_query}**")
-                interpreted = llm_tools.interpret_query_with_llm(product_query)
-                st.success(f"Diterjemahkan (LLM): **{interpreted}**")
+            # 1. Nama produk persis -> langsung; teks bebas -> pencarian TF-IDF lokal (tanpa LLM)
+            is_product = recommender.has_product(product_query)
+            recs = None if is_product else recommender.search(product_query, top_n, compact=True)
+
+            if recs is None or isinstance(recs, str):
+                # 2. Interpretasi Query (Jika diaktifkan), hanya jika pencarian lokal tidak menemukan apa pun
+                interpreted = product_query
+                if use_llm and llm_tools and not is_product:
+                    st.info(f"Input User: **{product_query}**")
+                    interpreted = llm_tools.interpret_query_with_llm(product_query)
+                    st.success(f"Diterjemahkan (LLM): **{interpreted}**")
 
-            # 2. Ambil Rekomendasi
-            recs = recommender.get_recommendations(interpreted, top_n)
+                # 3. Ambil Rekomendasi
+                recs = recommender.get_recommendations(interpreted, top_n, compact=True)
 
             if isinstance(recs, str): # Error/Not Found
                 st.error(recs)
@@ -202,7 +204,7 @@ def main_app():
         
         fig, ax = plt.subplots(figsize=(10, 8))
         sns.heatmap(
-            recommender.hybrid_sim[np.ix_(sample_indices, sample_indices)],
+            recommender.similarity_block(sample_indices),
             xticklabels=sample_names,
             yticklabels=sample_names,
             cmap='YlGnBu',
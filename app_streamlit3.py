@@ -7,16 +7,15 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import logging
 import time
+from types import SimpleNamespace
 
 # --- Mock Modules (JIKA TIDAK ADA MODULE LOKAL) ---
 # Hapus bagian "TRY/EXCEPT" ini jika file src/ kamu sudah lengkap.
 # Ini hanya agar kode bisa jalan di saya tanpa file src aslimu.
 try:
-    from src.data_loader import load_local_data
-    from src.preprocessing import clean_and_handle_missing_values
-    from src.feature_engineering import create_features
-    from src.modelling import build_hybrid_model, calculate_evaluation_metrics
+    from src.model_store import artifact_version, load_or_build_artifact
     from src.integratedRecommender import IntegratedRecommender
+    from src.recommendation_cache import RecommendationCache
     from src.evaluasiLlm import LLMTools, HybridEvaluation
 except ImportError:
     # Dummy classes placeholders agar tidak error saat copy-paste
@@ -37,16 +36,22 @@ except ImportError:
             'ImageURL': ['https://via.placeholder.com/300']*20
         }
         return pd.DataFrame(data)
-    def clean_and_handle_missing_values(df): return df
-    def create_features(df): return df, None
-    def build_hybrid_model(df, tf): return np.eye(len(df))
-    def calculate_evaluation_metrics(df, sim): return {}
+    def load_or_build_artifact(path):
+        df = load_local_data(path)
+        return SimpleNamespace(df=df, graph=np.eye(len(df)), metrics={}, variants=None, version=None, priors=None,
+                               vectorizer=None, tfidf_matrix=None, svd=None, embedding=None, serving=None)
+    def artifact_version(path): return None
     class IntegratedRecommender:
-        def __init__(self, df, sim): self.df=df; self.hybrid_sim=sim
-        def get_recommendations(self, q, n): 
+        def __init__(self, df, sim, **kwargs): self.df=df; self.hybrid_sim=sim; self.metrics={}
+        def current(self): return self
+        @classmethod
+        def from_artifact(cls, artifact): return cls(artifact.df, artifact.graph)
+        def has_product(self, q): return True
+        def get_recommendations(self, q, n, **kwargs): 
             df = self.df.copy()
             df['final_score'] = np.random.rand(len(df))
             return df.head(n)
+    def RecommendationCache(recommender, **kwargs): return recommender
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -316,18 +321,21 @@ def render_product_card(row, full_df=None):
 def initialize_system():
     """Load data & models."""
     try:
-        df = load_local_data(DATA_FILE_PATH)
-        if df.empty: return None, None, None, None
-        df = clean_and_handle_missing_values(df)
-        df, tfidf = create_features(df)
-        hybrid_sim = build_hybrid_model(df, tfidf)
-        metrics = calculate_evaluation_metrics(df, hybrid_sim)
+        artifact = load_or_build_artifact(DATA_FILE_PATH)
+        if artifact.df.empty: return None, None
         llm_tools = LLMTools()
-        recommender = IntegratedRecommender(df, hybrid_sim)
-        return df, recommender, llm_tools, metrics
+        recommender = IntegratedRecommender.from_artifact(artifact)
+        # Query identik dari banyak user dilayani dari cache; versi data dicek berkala dan recommender
+        # diganti (cache dikosongkan) saat CSV berubah
+        recommender = RecommendationCache(
+            recommender,
+            version_source=lambda: artifact_version(DATA_FILE_PATH),
+            loader=lambda version: IntegratedRecommender.from_artifact(load_or_build_artifact(DATA_FILE_PATH)),
+        )
+        return recommender, llm_tools
     except Exception as e:
         logger.error(f"Init Error: {e}")
-        return None, None, None, None
+        return None, None
 
 # --- PAGES ---
 
@@ -365,12 +373,17 @@ def page_recommender(df, recommender, llm_tools):
     if (do_search or trigger) and query:
         st.session_state.trigger_search = False
         with st.spinner("🔍 Menganalisis preferensi Anda..."):
-            # Simulasi interpretasi LLM
-            interpreted_q = llm_tools.interpret_query_with_llm(query)
-            if interpreted_q != query:
-                st.toast(f"AI: Saya perjelas pencarianmu menjadi '{interpreted_q}'", icon="🤖")
-            
-            recs = recommender.get_recommendations(interpreted_q, int(top_n))
+            # Nama produk persis -> langsung; teks bebas -> pencarian TF-IDF lokal dulu (tanpa LLM)
+            is_product = recommender.has_product(query)
+            recs = None if is_product else recommender.search(query, int(top_n), compact=True)
+
+            if recs is None or isinstance(recs, str):
+                # Simulasi interpretasi LLM
+                interpreted_q = query if is_product else llm_tools.interpret_query_with_llm(query)
+                if interpreted_q != query:
+                    st.toast(f"AI: Saya perjelas pencarianmu menjadi '{interpreted_q}'", icon="🤖")
+
+                recs = recommender.get_recommendations(interpreted_q, int(top_n), compact=True)
             
             if not isinstance(recs, str) and not recs.empty:
                 st.session_state['current_rekom'] = recs
@@ -478,11 +491,13 @@ def main():
     if "current_page" not in st.session_state: st.session_state["current_page"] = "home"
     
     # 3. Load System
-    df, recommender, llm_tools, metrics = initialize_system()
+    recommender, llm_tools = initialize_system()
     
-    if df is None:
+    if recommender is None:
         st.error("Gagal memuat data. Pastikan file 'data/product_data.csv' tersedia.")
         return
+    # Katalog dibaca dari recommender aktif per render (bisa berganti saat versi artefak berubah)
+    df = recommender.current().df
 
     # 4. Routing
     if st.session_state["current_page"] == "home":
@@ -2,18 +2,15 @@
 
 import streamlit as st
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import logging
 import os
 
 # Import modul lokal dari folder src
-from src.data_loader import load_local_data
-from src.preprocessing import clean_and_handle_missing_values
-from src.feature_engineering import create_features
-from src.modelling import build_hybrid_model, calculate_evaluation_metrics
+from src.model_store import artifact_version, load_or_build_artifact
 from src.integratedRecommender import IntegratedRecommender
+from src.recommendation_cache import RecommendationCache
 from src.evaluasiLlm import LLMTools, HybridEvaluation
 
 # --- Setup Logging ---
@@ -198,28 +195,25 @@ def render_product_card(row, full_df=None):
 def initialize_system():
     """Memuat data, preprocessing, dan membangun model. Dicache agar cepat."""
     try:
-        # 1. Load Data
-        df = load_local_data(DATA_FILE_PATH)
-        if df.empty:
-            return None, None, None, None
-
-        # 2. Preprocessing & Feature Engineering
-        df = clean_and_handle_missing_values(df)
-        df, tfidf_matrix = create_features(df)
+        # 1. Load artefak model (pipeline hanya dijalankan ulang jika versi data berubah)
+        artifact = load_or_build_artifact(DATA_FILE_PATH)
         
-        # 3. Modelling & Metrics
-        hybrid_sim = build_hybrid_model(df, tfidf_matrix)
-        metrics = calculate_evaluation_metrics(df, hybrid_sim)
-        
-        # 4. LLM & Recommender Setup
+        # 2. LLM & Recommender Setup
         llm_tools = LLMTools()
-        recommender = IntegratedRecommender(df, hybrid_sim)
+        recommender = IntegratedRecommender.from_artifact(artifact)
+        # Query identik dari banyak user dilayani dari cache; versi data dicek berkala dan recommender
+        # diganti (cache dikosongkan) saat CSV berubah
+        recommender = RecommendationCache(
+            recommender,
+            version_source=lambda: artifact_version(DATA_FILE_PATH),
+            loader=lambda version: IntegratedRecommender.from_artifact(load_or_build_artifact(DATA_FILE_PATH)),
+        )
         
-        return df, recommender, llm_tools, metrics
+        return recommender, llm_tools
         
     except Exception as e:
         logger.error(f"Error initalization: {e}")
-        return None, None, None, None
+        return None, None
 
 # --- Halaman: Product Recommender (Final Layout) ---
 
@@ -299,14 +293,19 @@ def page_recommender(df, recommender, llm_tools, metrics):
         st.session_state.trigger_search = False 
         
         with st.spinner(f"Mencari produk terbaik untuk '{product_query}'..."):
-            interpreted = product_query
-            if llm_tools:
-                interpreted = llm_tools.interpret_query_with_llm(product_query)
-            
-            if interpreted != product_query:
-                st.info(f"💡 Query diperjelas AI: **{interpreted}**")
+            # Nama produk persis -> langsung; teks bebas -> pencarian TF-IDF lokal dulu (tanpa LLM)
+            is_product = recommender.has_product(product_query)
+            recs = None if is_product else recommender.search(product_query, int(top_n), compact=True)
+
+            if recs is None or isinstance(recs, str):
+                interpreted = product_query
+                if llm_tools and not is_product:
+                    interpreted = llm_tools.interpret_query_with_llm(product_query)
 
-            recs = recommender.get_recommendations(interpreted, int(top_n))
+                if interpreted != product_query:
+                    st.info(f"💡 Query diperjelas AI: **{interpreted}**")
+
+                recs = recommender.get_recommendations(interpreted, int(top_n), compact=True)
 
             if isinstance(recs, str) or recs.empty:
                 st.error("Tidak ada produk ditemukan.")
@@ -364,7 +363,7 @@ def page_recommender(df, recommender, llm_tools, metrics):
             
             fig3, ax3 = plt.subplots(figsize=(6, 4))
             sns.heatmap(
-                recommender.hybrid_sim[np.ix_(sample_indices, sample_indices)],
+                recommender.similarity_block(sample_indices),
                 xticklabels=sample_names, yticklabels=sample_names, cmap='YlGnBu', ax=ax3
             )
             st.pyplot(fig3)
@@ -547,12 +546,16 @@ def main():
     if "current_page" not in st.session_state:
         st.session_state["current_page"] = "home"
 
-    df, recommender, llm_tools, metrics = initialize_system()
+    recommender, llm_tools = initialize_system()
 
-    if df is None:
+    if recommender is None:
         st.error("Data tidak ditemukan. Pastikan file CSV tersedia.")
         return
 
+    # Katalog & metrik dibaca dari recommender aktif per render (bisa berganti saat versi artefak berubah)
+    live = recommender.current()
+    df, metrics = live.df, live.metrics
+
     # Routing
     if st.session_state["current_page"] == "home":
         page_home(df)
@@ -0,0 +1,263 @@
+# src/ann_index.py
+
+import pandas as pd
+import numpy as np
+from scipy import sparse
+import logging
+import time
+
+from src.feature_engineering import reduce_tfidf
+from src.modelling import (
+    CONTENT_WEIGHT, NUMERIC_WEIGHT, NUMERIC_COLUMNS, NeighborGraph, NumericAngleIndex, LazyHybridSimilarity,
+    compute_numeric_angles, hybrid_neighbors_for_rows, hybrid_scores, numeric_similarity,
+    prepare_content, select_top_k,
+)
+
+logger = logging.getLogger(__name__)
+
+class RandomHyperplaneLSH:
+    """ANN index (random-hyperplane LSH) di atas TF-IDF yang direduksi dengan TruncatedSVD.
+
+    Knob recall/kecepatan:
+    - n_bits: jumlah hyperplane per tabel. Lebih kecil = bucket lebih besar = recall naik, query lebih lambat.
+    - n_tables: jumlah tabel hash independen. Lebih banyak = recall naik, memori & waktu naik.
+    """
+
+    def __init__(self, n_components: int = 128, n_bits: int = 12, n_tables: int = 8, random_state: int = 42):
+        self.n_components = n_components
+        self.n_bits = n_bits
+        self.n_tables = n_tables
+        self.random_state = random_state
+
+    def fit(self, tfidf_matrix):
+        """Mereduksi TF-IDF (atau memakai embedding padat yang sudah ada), lalu meng-hash ke bucket tiap tabel."""
+        # 1. Reduksi dimensi + normalisasi L2 (cosine = dot product)
+        if sparse.issparse(tfidf_matrix):
+            embedding, self.svd = reduce_tfidf(tfidf_matrix, self.n_components, self.random_state)
+        else:
+            embedding, self.svd = prepare_content(tfidf_matrix), None
+        n_components = embedding.shape[1]
+
+        # 2. Hyperplane acak per tabel
+        rng = np.random.default_rng(self.random_state)
+        self.planes = rng.standard_normal((self.n_tables, n_components, self.n_bits)).astype(np.float32)
+
+        # 3. Bucket = kode hash terurut, sehingga anggota bucket dicari dengan binary search
+        self.codes = np.stack([self._hash(embedding, table) for table in range(self.n_tables)])
+        self.order = np.argsort(self.codes, axis=1, kind='stable')
+        self.sorted_codes = np.take_along_axis(self.codes, self.order, axis=1)
+        logger.info(f"LSH index siap: {self.n_tables} tabel x {self.n_bits} bit, dimensi {n_components}")
+        return self
+
+    def _hash(self, embedding: np.ndarray, table: int) -> np.ndarray:
+        bits = (embedding @ self.planes[table]) > 0
+        return bits.astype(np.int64) @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def candidates(self, idx: int) -> np.ndarray:
+        """Mengembalikan indeks produk yang berbagi bucket dengan produk idx di minimal satu tabel."""
+        members = []
+        for table in range(self.n_tables):
+            code = self.codes[table, idx]
+            lo = np.searchsorted(self.sorted_codes[table], code, side='left')
+            hi = np.searchsorted(self.sorted_codes[table], code, side='right')
+            members.append(self.order[table, lo:hi])
+        return np.unique(np.concatenate(members))
+
+def _ann_row_top_k(idx: int, content, angles: np.ndarray, index: RandomHyperplaneLSH,
+                   angle_index: NumericAngleIndex, k: int, numeric_candidates: int):
+    """Top-k Hybrid Similarity untuk satu produk, hanya menilai kandidat dari LSH + tetangga numerik."""
+    # Bobot numerik 60%, jadi tetangga numerik terdekat selalu ikut menjadi kandidat
+    numeric_idx, _ = angle_index.nearest(angles[idx], numeric_candidates, exclude=idx)
+    cands = np.union1d(index.candidates(idx), numeric_idx)
+    cands = cands[cands != idx]
+
+    if len(cands) < k:
+        # Kandidat terlalu sedikit: hitung baris penuh untuk produk ini
+        cands = np.delete(np.arange(content.shape[0]), idx)
+
+    scores = hybrid_scores(content, angles, idx, cands)
+    top_pos, top_scores = select_top_k(scores[np.newaxis, :], k)
+    return cands[top_pos[0]], top_scores[0], len(cands)
+
+def build_ann_neighbors(df: pd.DataFrame, tfidf_matrix, index: RandomHyperplaneLSH | None = None,
+                        top_k: int = 50, numeric_candidates: int = 200,
+                        lsh_params: dict | None = None) -> NeighborGraph:
+    """Membangun graf tetangga top-K secara aproksimatif (ANN); keluaran sama dengan build_hybrid_neighbors.
+
+    lsh_params: parameter RandomHyperplaneLSH (n_components, n_bits, n_tables) jika index tidak diberikan,
+    mis. setting terbaik dari ann_recall_report.
+    """
+    n_products = tfidf_matrix.shape[0]
+    k = min(top_k, n_products - 1)
+    logger.info(f"Membangun Hybrid Model (Top-{k} Neighbor Graph, ANN/LSH)...")
+
+    content = prepare_content(tfidf_matrix)
+    angles = compute_numeric_angles(df[NUMERIC_COLUMNS].values)
+    angle_index = NumericAngleIndex(angles)
+    index = index or RandomHyperplaneLSH(**(lsh_params or {})).fit(tfidf_matrix)
+
+    indices = np.empty((n_products, max(k, 0)), dtype=np.int32)
+    scores = np.empty((n_products, max(k, 0)), dtype=np.float32)
+    if k > 0:
+        for idx in range(n_products):
+            indices[idx], scores[idx], _ = _ann_row_top_k(idx, content, angles, index, angle_index, k, numeric_candidates)
+
+    logger.info(f"Neighbor graph shape: {indices.shape}")
+    return NeighborGraph(indices, scores, angles)
+
+def build_partitioned_neighbors(df: pd.DataFrame, tfidf_matrix, top_k: int = 50, cross_k: int = 10,
+                                index: RandomHyperplaneLSH | None = None, block_size: int = 512,
+                                lsh_params: dict | None = None) -> NeighborGraph:
+    """Membangun graf tetangga top-K per blok Category: exact di dalam kategori + kandidat lintas kategori dari LSH.
+
+    Biaya build ~ jumlah kuadrat ukuran kategori (bukan N^2). Hasilnya graf block-sparse: sebagian besar
+    tetangga berada di blok kategori yang sama, ditambah maksimal cross_k tetangga dari kategori lain.
+    lsh_params: parameter RandomHyperplaneLSH untuk kandidat lintas kategori jika index tidak diberikan.
+    """
+    n_products = tfidf_matrix.shape[0]
+    k = min(top_k, n_products - 1)
+    content = prepare_content(tfidf_matrix)
+    angles = compute_numeric_angles(df[NUMERIC_COLUMNS].values)
+    categories, labels = pd.factorize(df['Category'])
+    sizes = np.bincount(categories, minlength=len(labels))
+    logger.info(
+        f"Membangun Hybrid Model (Top-{k}, {len(labels)} blok kategori, "
+        f"biaya {np.sum(sizes.astype(np.float64) ** 2) / n_products**2:.1%} dari N^2)..."
+    )
+
+    # Kandidat per baris: (indeks, skor) dari blok kategori + lintas kategori
+    cand_idx = [[] for _ in range(n_products)]
+    cand_scores = [[] for _ in range(n_products)]
+
+    # 1. Exact di dalam tiap blok kategori
+    for cat in range(len(labels)):
+        members = np.flatnonzero(categories == cat)
+        k_block = min(k, len(members) - 1)
+        if k_block <= 0:
+            continue
+        member_content = content[members]
+        for start in range(0, len(members), block_size):
+            chunk = members[start:start + block_size]
+            block = content[chunk] @ member_content.T
+            block = block.toarray() if sparse.issparse(block) else np.asarray(block, dtype=np.float64)
+            block = CONTENT_WEIGHT * block + NUMERIC_WEIGHT * numeric_similarity(angles[chunk], angles[members])
+            block[np.arange(len(chunk)), np.arange(start, start + len(chunk))] = -np.inf
+            top_pos, top_scores = select_top_k(block, k_block)
+            for row, pos, row_scores in zip(chunk, top_pos, top_scores):
+                cand_idx[row].append(members[pos])
+                cand_scores[row].append(row_scores)
+
+    # 2. Kandidat lintas kategori dari LSH (dinilai exact, diambil cross_k terbaik)
+    if cross_k > 0:
+        index = index or RandomHyperplaneLSH(**(lsh_params or {})).fit(tfidf_matrix)
+        for row in range(n_products):
+            cands = index.candidates(row)
+            cands = cands[categories[cands] != categories[row]]
+            if len(cands) == 0:
+                continue
+            scores = hybrid_scores(content, angles, row, cands)
+            top_pos, top_scores = select_top_k(scores[np.newaxis, :], min(cross_k, len(cands)))
+            cand_idx[row].append(cands[top_pos[0]])
+            cand_scores[row].append(top_scores[0])
+
+    # 3. Gabungkan kandidat menjadi top-k per baris
+    indices = np.empty((n_products, max(k, 0)), dtype=np.int32)
+    scores = np.empty((n_products, max(k, 0)), dtype=np.float32)
+    short_rows = []
+    for row in range(n_products):
+        if k <= 0:
+            break
+        if sum(len(c) for c in cand_idx[row]) < k:
+            # Kategori terlalu kecil & kandidat lintas kategori kurang: hitung baris penuh
+            short_rows.append(row)
+            continue
+        row_idx, row_scores = np.concatenate(cand_idx[row]), np.concatenate(cand_scores[row])
+        top_pos, top_scores = select_top_k(row_scores[np.newaxis, :], k)
+        indices[row], scores[row] = row_idx[top_pos[0]], top_scores[0]
+
+    if short_rows:
+        indices[short_rows], scores[short_rows] = hybrid_neighbors_for_rows(content, angles, np.array(short_rows), k)
+
+    logger.info(f"Neighbor graph shape: {indices.shape} ({len(short_rows)} baris dihitung penuh)")
+    return NeighborGraph(indices, scores, angles)
+
+def recall_at_k(exact_indices: np.ndarray, approx_indices: np.ndarray, k: int) -> float:
+    """Rata-rata proporsi top-k exact yang ditemukan oleh metode aproksimatif."""
+    hits = [len(np.intersect1d(e[:k], a[:k])) / k for e, a in zip(exact_indices, approx_indices)]
+    return float(np.mean(hits)) if hits else 0.0
+
+def ann_recall_report(df: pd.DataFrame, tfidf_matrix, settings: list[dict], k: int = 10,
+                      sample_size: int = 500, random_state: int = 42) -> pd.DataFrame:
+    """Membandingkan recall@k & kecepatan beberapa setting LSH terhadap metode exact (pada sampel produk).
+
+    Tiap setting berisi parameter RandomHyperplaneLSH (n_components, n_bits, n_tables) dan
+    opsional numeric_candidates (default 200), contoh: [{'n_bits': 8, 'n_tables': 8}].
+    """
+    n_products = tfidf_matrix.shape[0]
+    k = min(k, n_products - 1)
+    rng = np.random.default_rng(random_state)
+    sample = rng.choice(n_products, size=min(sample_size, n_products), replace=False)
+
+    # 1. Ground truth exact (on-demand per baris, tanpa matriks N x N)
+    exact_model = LazyHybridSimilarity(tfidf_matrix, df[NUMERIC_COLUMNS].values)
+    start = time.perf_counter()
+    exact = [exact_model.neighbors(idx, k)[0] for idx in sample]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    content = exact_model.content
+    angles = exact_model.angles
+    angle_index = NumericAngleIndex(angles)
+
+    # 2. Evaluasi tiap setting LSH
+    rows = [{'method': 'exact', f'recall@{k}': 1.0, 'avg_candidates': n_products - 1,
+             'build_sec': 0.0, 'query_ms': exact_ms}]
+    for setting in settings:
+        lsh_params = {key: value for key, value in setting.items() if key != 'numeric_candidates'}
+        numeric_candidates = setting.get('numeric_candidates', 200)
+
+        start = time.perf_counter()
+        index = RandomHyperplaneLSH(random_state=random_state, **lsh_params).fit(tfidf_matrix)
+        build_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [_ann_row_top_k(idx, content, angles, index, angle_index, k, numeric_candidates) for idx in sample]
+        query_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+        rows.append({
+            'method': 'lsh ' + ', '.join(f"{key}={value}" for key, value in setting.items()),
+            f'recall@{k}': recall_at_k(exact, [r[0] for r in results], k),
+            'avg_candidates': float(np.mean([r[2] for r in results])),
+            'build_sec': build_sec,
+            'query_ms': query_ms,
+        })
+
+    return pd.DataFrame(rows)
+
+
+def compare_content_representations(df: pd.DataFrame, tfidf_matrix, embedding: np.ndarray, k: int = 10,
+                                    sample_size: int = 500, random_state: int = 42) -> pd.DataFrame:
+    """Membandingkan kualitas (recall@k terhadap TF-IDF exact) & kecepatan TF-IDF mentah vs embedding SVD."""
+    n_products = tfidf_matrix.shape[0]
+    k = min(k, n_products - 1)
+    rng = np.random.default_rng(random_state)
+    sample = rng.choice(n_products, size=min(sample_size, n_products), replace=False)
+    num_features = df[NUMERIC_COLUMNS].values
+
+    rows, reference = [], None
+    for name, matrix in [('tfidf', tfidf_matrix), (f'svd-{embedding.shape[1]}', embedding)]:
+        model = LazyHybridSimilarity(matrix, num_features)
+        start = time.perf_counter()
+        result = [model.neighbors(idx, k)[0] for idx in sample]
+        query_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+        content = model.content
+        memory = content.data.nbytes + content.indices.nbytes + content.indptr.nbytes if sparse.issparse(content) else content.nbytes
+        reference = result if reference is None else reference
+        rows.append({
+            'representation': name,
+            f'recall@{k}': recall_at_k(reference, result, k),
+            'query_ms': query_ms,
+            'content_mb': memory / 1024**2,
+        })
+
+    return pd.DataFrame(rows)
\ No newline at end of file
@@ -2,19 +2,16 @@
 
 import pandas as pd
 import numpy as np
+from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import MinMaxScaler
+from sklearn.preprocessing import MinMaxScaler, normalize
 import logging
 
 logger = logging.getLogger(__name__)
 
-def create_features(df: pd.DataFrame):
-    """Membuat fitur teks (TF-IDF) dan numerik (Scaled) dari DataFrame."""
-    df = df.copy()
-    logger.info("Memulai Feature Engineering...")
-    
-    # 1. Gabungkan semua kolom teks
-    df['text_features'] = (
+def _combine_text_features(df: pd.DataFrame) -> pd.Series:
+    """Menggabungkan semua kolom teks menjadi satu string per produk."""
+    return (
         df['Name'] + ' ' +
         df['Description'] + ' ' +
         df['Tags'] + ' ' +
@@ -22,6 +19,18 @@ def create_features(df: pd.DataFrame):
         df['Category']
     )
 
+def create_features(df: pd.DataFrame, return_transformers: bool = False):
+    """Membuat fitur teks (TF-IDF) dan numerik (Scaled) dari DataFrame.
+
+    Jika return_transformers=True, vectorizer & scaler yang sudah di-fit ikut dikembalikan
+    (dibutuhkan untuk menyimpan artefak model).
+    """
+    df = df.copy()
+    logger.info("Memulai Feature Engineering...")
+    
+    # 1. Gabungkan semua kolom teks
+    df['text_features'] = _combine_text_features(df)
+
     # 2. TF-IDF vectorization
     vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
     tfidf_matrix = vectorizer.fit_transform(df['text_features'])
@@ -38,4 +47,38 @@ def create_features(df: pd.DataFrame):
     df['ReviewCount_scaled_log'] = df['review_log'] / df['review_log'].max()
     
     logger.info("Feature Engineering selesai.")
-    return df, tfidf_matrix
\ No newline at end of file
+    if return_transformers:
+        return df, tfidf_matrix, vectorizer, scaler
+    return df, tfidf_matrix
+
+def transform_features(df: pd.DataFrame, vectorizer, scaler, review_log_max: float):
+    """Membuat fitur untuk produk baru memakai vectorizer & scaler yang sudah di-fit (tanpa refit)."""
+    df = df.copy()
+    df['text_features'] = _combine_text_features(df)
+    tfidf_matrix = vectorizer.transform(df['text_features'])
+
+    # Nilai di luar rentang data fit di-clip agar tetap konsisten dengan katalog lama
+    df[['Rating_scaled', 'ReviewCount_scaled']] = np.clip(
+        scaler.transform(df[['Rating', 'ReviewCount']]), 0, 1
+    )
+    df['review_log'] = np.log1p(df['ReviewCount'])
+    df['ReviewCount_scaled_log'] = np.clip(df['review_log'] / review_log_max, 0, 1)
+    return df, tfidf_matrix
+
+def compute_popularity_priors(df: pd.DataFrame) -> np.ndarray:
+    """Prior popularitas untuk final score: array float32 (N, 2) berisi [rating_norm, review_norm] (min-max 0-1)."""
+    values = df[['Rating', 'ReviewCount']].to_numpy(dtype=np.float64)
+    min_values, max_values = values.min(axis=0), values.max(axis=0)
+    value_range = np.where(max_values > min_values, max_values - min_values, 1.0)
+    return ((values - min_values) / value_range).astype(np.float32)
+
+def reduce_tfidf(tfidf_matrix, n_components: int = 128, random_state: int = 42):
+    """Mereduksi TF-IDF menjadi embedding padat float32 (TruncatedSVD, dinormalisasi L2)."""
+    n_components = min(n_components, tfidf_matrix.shape[1] - 1)
+    svd = TruncatedSVD(n_components=n_components, random_state=random_state)
+    embedding = np.ascontiguousarray(normalize(svd.fit_transform(tfidf_matrix)), dtype=np.float32)
+    logger.info(
+        f"Embedding SVD shape: {embedding.shape} "
+        f"(explained variance: {svd.explained_variance_ratio_.sum():.2%})"
+    )
+    return embedding, svd
\ No newline at end of file
@@ -0,0 +1,164 @@
+# src/incremental.py
+
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from dataclasses import replace
+import hashlib
+import logging
+
+from src.preprocessing import clean_and_handle_missing_values, collapse_into_catalog
+from src.feature_engineering import compute_popularity_priors, transform_features
+from src.modelling import (
+    NUMERIC_COLUMNS, NeighborGraph, build_serving_table, calculate_evaluation_metrics, compute_numeric_angles,
+    hybrid_neighbors_for_rows, hybrid_similarity_block, prepare_content, select_top_k,
+)
+from src.model_store import MODEL_FORMAT_VERSION, ModelArtifact
+
+logger = logging.getLogger(__name__)
+
+def _derive_version(base_version: str, action: str, prod_ids) -> str:
+    """Versi baru yang deterministik untuk artefak hasil update inkremental."""
+    digest = hashlib.sha256(f"{MODEL_FORMAT_VERSION}|{base_version}|{action}|".encode())
+    digest.update(','.join(map(str, prod_ids)).encode())
+    return digest.hexdigest()[:12]
+
+def _rebuild_artifact(artifact: ModelArtifact, df: pd.DataFrame, tfidf_matrix, embedding: np.ndarray | None,
+                      graph: NeighborGraph, version: str, variants: pd.DataFrame | None = None) -> ModelArtifact:
+    metrics = calculate_evaluation_metrics(df, graph)
+    # Pertahankan format penyimpanan skor artefak asal
+    if artifact.graph.score_dtype != 'float32':
+        graph = graph.quantize(artifact.graph.score_dtype)
+    # Rentang min-max bisa berubah setelah add/remove, jadi prior & serving table dihitung ulang (O(N K))
+    priors = compute_popularity_priors(df)
+    serving = None
+    if artifact.serving is not None:
+        serving = build_serving_table(graph, priors, artifact.serving.top_n, artifact.serving.weights)
+    return ModelArtifact(
+        version=version,
+        df=df,
+        tfidf_matrix=tfidf_matrix,
+        graph=graph,
+        vectorizer=artifact.vectorizer,
+        scaler=artifact.scaler,
+        review_log_max=artifact.review_log_max,
+        metrics=metrics,
+        embedding=embedding,
+        svd=artifact.svd,
+        variants=variants if variants is not None else artifact.variants,
+        dedup_threshold=artifact.dedup_threshold,
+        priors=priors,
+        serving=serving,
+    )
+
+def add_products(artifact: ModelArtifact, new_df: pd.DataFrame, version: str | None = None,
+                 block_size: int = 512) -> ModelArtifact:
+    """Menambahkan produk baru tanpa refit: transformasi baris baru saja, lalu patch graf tetangga.
+
+    Untuk memakai hasilnya lewat load_or_build_artifact, isi version dengan artifact_version(...) dari CSV
+    yang sudah diperbarui (dengan parameter build yang sama), lalu simpan dengan save_model_artifact.
+    """
+    # 1. Cleaning & fitur untuk baris baru saja (vectorizer & scaler lama, imputasi Rating dari katalog artefak)
+    new_df = clean_and_handle_missing_values(new_df, reference=artifact.df)
+    if 'ProdID' in new_df.columns:
+        new_df = new_df[~new_df['ProdID'].isin(artifact.df['ProdID'])].reset_index(drop=True)
+    variants, new_variants = artifact.variants, None
+    if artifact.dedup_threshold is not None and not new_df.empty:
+        # Artefak dibangun dengan dedup: listing baru yang near-duplicate menjadi varian produk kanonik
+        new_df, new_variants = collapse_into_catalog(new_df, artifact.df, threshold=artifact.dedup_threshold)
+        variants = pd.concat([variants, new_variants], ignore_index=True) if variants is not None else new_variants
+    elif artifact.variants is not None:
+        logger.warning("Artefak memuat varian tetapi tanpa dedup_threshold; listing baru tidak dicek near-duplicate.")
+    if new_df.empty:
+        if new_variants is None or new_variants.empty:
+            logger.info("Tidak ada produk baru untuk ditambahkan.")
+            return artifact
+        # Semua listing baru adalah varian: graf tetap, hanya tabel varian yang bertambah
+        logger.info(f"{len(new_variants)} listing baru digabung sebagai varian; katalog tidak berubah.")
+        version = version or _derive_version(artifact.version, 'add', new_variants.get('ProdID', new_variants['Name']))
+        return replace(artifact, version=version, variants=variants, path=None)
+    new_df, new_tfidf = transform_features(new_df, artifact.vectorizer, artifact.scaler, artifact.review_log_max)
+
+    n_old, n_new = len(artifact.df), len(new_df)
+    df = pd.concat([artifact.df, new_df[artifact.df.columns.intersection(new_df.columns)]], ignore_index=True)
+    tfidf_matrix = sparse.vstack([artifact.tfidf_matrix, new_tfidf]).tocsr()
+    logger.info(f"Menambahkan {n_new} produk ke katalog {n_old} produk (inkremental)...")
+
+    # Jika artefak memakai embedding SVD, produk baru diproyeksikan dengan SVD yang sama
+    embedding = None
+    if artifact.embedding is not None:
+        embedding = np.vstack([artifact.embedding, prepare_content(artifact.svd.transform(new_tfidf))])
+    content = prepare_content(embedding if embedding is not None else tfidf_matrix)
+    angles = compute_numeric_angles(df[NUMERIC_COLUMNS].values)
+    k = artifact.graph.top_k
+    indices = np.vstack([np.asarray(artifact.graph.indices, dtype=np.int32), np.empty((n_new, k), dtype=np.int32)])
+    scores = np.vstack([np.asarray(artifact.graph.scores, dtype=np.float32), np.empty((n_new, k), dtype=np.float32)])
+
+    # 2. Per blok produk baru: hitung tetangganya, lalu patch daftar tetangga produk lama
+    affected = np.zeros(n_old, dtype=bool)
+    for start in range(n_old, n_old + n_new, block_size):
+        stop = min(start + block_size, n_old + n_new)
+        block = hybrid_similarity_block(content, angles, slice(start, stop))
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        indices[start:stop], scores[start:stop] = select_top_k(block, k)
+
+        # Similarity simetris: kolom blok = skor produk lama terhadap produk baru
+        cand_scores = block[:, :n_old].T
+        improved = cand_scores.max(axis=1) > scores[:n_old, -1]
+        if improved.any():
+            rows = np.flatnonzero(improved)
+            merged_idx = np.hstack([indices[rows], np.broadcast_to(np.arange(start, stop), (len(rows), stop - start))])
+            merged_scores = np.hstack([scores[rows], cand_scores[rows]])
+            top_pos, top_scores = select_top_k(merged_scores, k)
+            indices[rows] = np.take_along_axis(merged_idx, top_pos, axis=1)
+            scores[rows] = top_scores
+            affected[rows] = True
+
+    logger.info(f"Graf tetangga diperbarui: {affected.sum()} produk lama terdampak.")
+    version = version or _derive_version(artifact.version, 'add', new_df.get('ProdID', new_df['Name']))
+    return _rebuild_artifact(artifact, df, tfidf_matrix, embedding, NeighborGraph(indices, scores, angles), version,
+                             variants)
+
+def remove_products(artifact: ModelArtifact, prod_ids, version: str | None = None) -> ModelArtifact:
+    """Menghapus produk berdasarkan ProdID; hanya produk yang kehilangan tetangga yang dihitung ulang."""
+    keep = ~artifact.df['ProdID'].isin(prod_ids).values
+    n_removed = int((~keep).sum())
+    if n_removed == 0:
+        logger.info("Tidak ada produk yang dihapus.")
+        return artifact
+
+    # 1. Petakan indeks lama -> baru (-1 = dihapus)
+    mapping = np.full(len(keep), -1, dtype=np.int64)
+    mapping[keep] = np.arange(keep.sum())
+    df = artifact.df[keep].reset_index(drop=True)
+    tfidf_matrix = artifact.tfidf_matrix[keep].tocsr()
+    embedding = None if artifact.embedding is None else np.asarray(artifact.embedding[keep])
+    n_products = len(df)
+    logger.info(f"Menghapus {n_removed} produk dari katalog (inkremental)...")
+
+    indices = mapping[np.asarray(artifact.graph.indices)[keep]]
+    scores = np.asarray(artifact.graph.scores[keep], dtype=np.float32)
+    k = min(artifact.graph.top_k, n_products - 1)
+
+    # 2. Produk yang salah satu tetangganya dihapus dihitung ulang secara exact
+    if k < artifact.graph.top_k:
+        affected = np.arange(n_products)
+    else:
+        affected = np.flatnonzero((indices < 0).any(axis=1))
+
+    indices = indices[:, :k].astype(np.int32)
+    scores = scores[:, :k]
+    angles = compute_numeric_angles(df[NUMERIC_COLUMNS].values)
+    if len(affected) and k > 0:
+        content = prepare_content(embedding if embedding is not None else tfidf_matrix)
+        indices[affected], scores[affected] = hybrid_neighbors_for_rows(content, angles, affected, k)
+
+    logger.info(f"Graf tetangga diperbarui: {len(affected)} produk dihitung ulang.")
+    # Varian dari produk kanonik yang dihapus ikut dibuang
+    variants = artifact.variants
+    if variants is not None and 'CanonicalProdID' in variants.columns:
+        variants = variants[~variants['CanonicalProdID'].isin(prod_ids)].reset_index(drop=True)
+
+    version = version or _derive_version(artifact.version, 'remove', sorted(prod_ids))
+    return _rebuild_artifact(artifact, df, tfidf_matrix, embedding, NeighborGraph(indices, scores, angles), version,
+                             variants)
@@ -2,64 +2,353 @@
 
 import pandas as pd
 import numpy as np
-from difflib import get_close_matches
+from sklearn.preprocessing import normalize
 import logging
+from src.modelling import (
+    CANDIDATE_EXTRA, NeighborGraph, LazyHybridSimilarity, HybridWeights, DEFAULT_WEIGHTS, ServingTable,
+    hybrid_neighbors_for_rows, hybrid_scores, select_top_k,
+)
+from src.search_index import CatalogFilterIndex, NameSearchIndex, RecommendationFilter
+from src.feature_engineering import compute_popularity_priors
 
 logger = logging.getLogger(__name__)
 
+DISPLAY_COLUMNS = ['Name', 'Brand', 'Category', 'Rating', 'ReviewCount', 'final_score', 'Description']
+
+class RecommendationResult:
+    """Hasil rekomendasi ringkas: indeks baris katalog + skor; kolom tampilan diambil dari katalog saat dirender.
+
+    Mendukung subset API DataFrame yang dipakai UI (len, empty, [kolom], [[kolom]], iterrows, copy).
+    """
+    SCORE_COLUMNS = ('final_score', 'similarity', 'rating_norm', 'review_norm')
+
+    def __init__(self, catalog: pd.DataFrame, rows: np.ndarray, final_score: np.ndarray, similarity: np.ndarray,
+                 rating_norm: np.ndarray, review_norm: np.ndarray, columns: list[str] | None = None):
+        # catalog hanya direferensikan (tidak dikopi), sehingga memori per sesi ~ O(n)
+        self.catalog = catalog
+        self.rows = rows
+        self.final_score = final_score
+        self.similarity = similarity
+        self.rating_norm = rating_norm
+        self.review_norm = review_norm
+        self.columns = list(columns or DISPLAY_COLUMNS)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.rows) == 0
+
+    def column(self, name: str) -> pd.Series:
+        """Satu kolom hasil (skor atau kolom katalog), berindeks label baris katalog."""
+        index = self.catalog.index[self.rows]
+        if name in self.SCORE_COLUMNS:
+            return pd.Series(getattr(self, name), index=index, name=name)
+        return self.catalog[name].iloc[self.rows]
+
+    def to_frame(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """Materialisasi DataFrame hanya untuk baris hasil & kolom yang diminta."""
+        columns = list(columns or self.columns)
+        frame = self.catalog.iloc[self.rows][[c for c in columns if c not in self.SCORE_COLUMNS]]
+        for position, name in enumerate(columns):
+            if name in self.SCORE_COLUMNS:
+                frame.insert(position, name, getattr(self, name))
+        return frame
+
+    def __getitem__(self, key):
+        return self.column(key) if isinstance(key, str) else self.to_frame(list(key))
+
+    def iterrows(self):
+        return self.to_frame().iterrows()
+
+    def copy(self):
+        # Array hasil tidak pernah diubah, jadi aman dibagi
+        return self
+
 class IntegratedRecommender:
-    def __init__(self, df: pd.DataFrame, hybrid_sim: np.ndarray):
+    def __init__(self, df: pd.DataFrame, hybrid_sim: np.ndarray | NeighborGraph | LazyHybridSimilarity,
+                 variants: pd.DataFrame | None = None, model_version: str | None = None,
+                 priors: np.ndarray | None = None, vectorizer=None, tfidf_matrix=None, svd=None,
+                 embedding: np.ndarray | None = None, serving: ServingTable | None = None,
+                 metrics: dict | None = None):
+        # hybrid_sim: matriks N x N (build_hybrid_model), graf top-K (build_hybrid_neighbors),
+        # atau skor on-demand per baris (build_lazy_hybrid_model)
+        # variants: tabel varian -> produk kanonik (collapse_near_duplicates), agar nama varian tetap dikenali
+        # model_version: versi artefak (dipakai RecommendationCache untuk invalidasi)
+        # priors: [rating_norm, review_norm] float32 dari artefak (compute_popularity_priors)
+        # vectorizer & tfidf_matrix (atau svd & embedding): untuk pencarian teks bebas lewat search()
+        # serving: tabel top-N offline (build_serving_table) untuk request default tanpa filter
+        # metrics: metrik evaluasi artefak (untuk ditampilkan UI bersama katalog yang sama)
         self.df = df
         self.hybrid_sim = hybrid_sim
+        self.model_version = model_version
+        self.vectorizer = vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.svd = svd
+        self.embedding = embedding
+        self.serving = serving
+        self.metrics = metrics or {}
 
-    def get_recommendations(self, product_name: str, n: int = 5):
-        """Fungsi rekomendasi hybrid utama (digunakan dalam UI/CLI)."""
-        product_name = product_name.strip().lower()
+        # Indeks nama ternormalisasi -> baris, dibangun sekali (nama duplikat: baris pertama yang dipakai)
         self.df['Name_norm'] = self.df['Name'].str.strip().str.lower()
-        
-        # 1. Cari produk acuan (termasuk fuzzy match)
-        idx = None
-        if product_name in self.df['Name_norm'].values:
-            idx = self.df[self.df['Name_norm'] == product_name].index[0]
-        else:
+        self.name_to_idx = {}
+        for i, name in enumerate(self.df['Name_norm']):
+            self.name_to_idx.setdefault(name, i)
+        self.search_index = NameSearchIndex(list(self.name_to_idx))
+
+        # Indeks Brand / Category / Rating untuk rekomendasi terfilter
+        self.filter_index = CatalogFilterIndex(self.df)
+
+        # Prior popularitas untuk final score (dihitung saat build model, bukan per query)
+        self.priors = priors if priors is not None else compute_popularity_priors(self.df)
+
+        self.variant_names = {}
+        if variants is not None and len(variants):
+            self.variant_names = dict(zip(
+                variants['Name'].str.strip().str.lower(), variants['CanonicalName'].str.strip().str.lower()
+            ))
+
+    @classmethod
+    def from_artifact(cls, artifact) -> 'IntegratedRecommender':
+        """Membuat recommender mode graph dari ModelArtifact (load_or_build_artifact / load_model_artifact)."""
+        return cls(artifact.df, artifact.graph, variants=artifact.variants, model_version=artifact.version,
+                   priors=artifact.priors, vectorizer=artifact.vectorizer, tfidf_matrix=artifact.tfidf_matrix,
+                   svd=artifact.svd, embedding=artifact.embedding, serving=artifact.serving, metrics=artifact.metrics)
+
+    def _resolve_product(self, product_name: str) -> int | None:
+        """Mencari baris produk acuan: exact (termasuk nama varian), partial match, lalu fuzzy match."""
+        product_name = product_name.strip().lower()
+        product_name = self.variant_names.get(product_name, product_name)
+
+        idx = self.name_to_idx.get(product_name)
+        if idx is None:
             # Cari yang mengandung kata kunci (partial match)
-            matches = self.df[self.df['Name_norm'].str.contains(product_name, case=False, na=False)]
-            if len(matches) > 0:
-                idx = matches.index[0]
+            match = self.search_index.first_containing(product_name)
+            if match is not None:
+                idx = self.name_to_idx[match]
                 logger.info(f"🔍 Produk mirip ditemukan (Partial Match): {self.df.iloc[idx]['Name']}")
             else:
                 # Cari yang paling mirip (close match)
-                closest = get_close_matches(product_name, self.df['Name_norm'], n=1, cutoff=0.4)
-                if closest:
-                    idx = self.df[self.df['Name_norm'] == closest[0]].index[0]
+                closest = self.search_index.closest(product_name, cutoff=0.4)
+                if closest is not None:
+                    idx = self.name_to_idx[closest]
                     logger.info(f"🔍 Produk tidak ditemukan persis. Menampilkan hasil mirip (Fuzzy Match): {self.df.iloc[idx]['Name']}")
-                else:
-                    return f"❌ Produk '{product_name}' tidak ditemukan di dataset."
+        return idx
+
+    def get_recommendations(self, product_name: str, n: int = 5, weights: HybridWeights | None = None,
+                            columns: list[str] | None = None, compact: bool = False,
+                            filters: RecommendationFilter | None = None):
+        """Fungsi rekomendasi hybrid utama (digunakan dalam UI/CLI).
 
-        # 2. Ambil skor similarity
-        sim_scores = list(enumerate(self.hybrid_sim[idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1:n+20] # ambil lebih banyak kandidat
+        weights: bobot per request (lihat HybridWeights); default 0.4/0.6 dan 0.4/0.3/0.3. Campuran
+            content/numeric selain bobot build dinilai exact terhadap seluruh katalog (mode graph butuh
+            tfidf_matrix atau embedding).
+        columns: kolom hasil (default DISPLAY_COLUMNS); hanya kolom ini yang diambil dari katalog.
+        compact: jika True, kembalikan RecommendationResult (kolom diambil saat dirender), bukan DataFrame.
+        filters: batasi hasil ke Brand / Category / Rating minimum (diterapkan saat memilih kandidat).
+        """
+        weights = weights or DEFAULT_WEIGHTS
 
-        # 3. Hitung Final Score
-        results = self.df.iloc[[i[0] for i in sim_scores]].copy()
-        results['similarity'] = [s[1] for s in sim_scores]
+        # 1. Cari produk acuan (termasuk fuzzy match)
+        idx = self._resolve_product(product_name)
+        if idx is None:
+            return f"❌ Produk '{product_name.strip().lower()}' tidak ditemukan di dataset."
+
+        # 2. Request default (tanpa filter, bobot sama dengan tabel): slice langsung dari serving table
+        unfiltered = filters is None or filters.is_empty
+        if (unfiltered and self.serving is not None and isinstance(self.hybrid_sim, NeighborGraph)
+                and self.serving.supports(n, weights)):
+            rows, similarity = self.serving.lookup(idx, n)
+            return self._rerank(rows, similarity, n, weights, columns, compact)
 
-        # Normalisasi ulang rating & review agar 0-1 (untuk final score)
-        min_rating, max_rating = self.df['Rating'].min(), self.df['Rating'].max()
-        min_review, max_review = self.df['ReviewCount'].min(), self.df['ReviewCount'].max()
+        # 3. Jalur live: ambil skor similarity
+        if not unfiltered:
+            mask = self.filter_index.mask(filters)
+            candidates, similarity = self._filtered_candidates(idx, n + CANDIDATE_EXTRA, weights, mask)
+            if len(candidates) == 0:
+                return f"❌ Tidak ada produk yang lolos filter untuk '{product_name.strip().lower()}'."
+        else:
+            # Top-(n + CANDIDATE_EXTRA) kandidat terurut menurun & tanpa produk acuan, bukan sort penuh N baris
+            candidates, similarity = self._candidate_block(np.array([idx]), n + CANDIDATE_EXTRA, weights)
+            candidates, similarity = candidates[0], similarity[0]
 
-        results['rating_norm'] = (results['Rating'] - min_rating) / (max_rating - min_rating)
-        results['review_norm'] = (results['ReviewCount'] - min_review) / (max_review - min_review)
+        return self._rerank(candidates, similarity, n, weights, columns, compact)
 
-        # Final Score: 40% Similarity + 30% Rating + 30% Review
-        results['final_score'] = (
-            0.4 * results['similarity'] +
-            0.3 * results['rating_norm'] +
-            0.3 * results['review_norm']
+    def _dense_rows(self, rows, weights: HybridWeights) -> np.ndarray:
+        """Salinan float64 baris matriks padat; hanya valid untuk campuran content/numeric saat build."""
+        if not weights.is_build_mix:
+            raise ValueError("Matriks padat tidak menyimpan komponen skor; gunakan mode graph atau lazy.")
+        return np.array(self.hybrid_sim[rows], dtype=np.float64)
+
+    def _content(self):
+        """Representasi content yang dipakai model (embedding SVD atau TF-IDF), jika tersedia."""
+        if isinstance(self.hybrid_sim, LazyHybridSimilarity):
+            return self.hybrid_sim.content
+        return self.embedding if self.embedding is not None else self.tfidf_matrix
+
+    def _exact_content(self):
+        """Content untuk skor exact di mode graph (bobot content/numeric di luar campuran build)."""
+        content = self._content()
+        if content is None:
+            raise ValueError("Bobot content/numeric kustom butuh tfidf_matrix atau embedding pada recommender.")
+        return content
+
+    def _filtered_candidates(self, idx: int, k: int, weights: HybridWeights, mask: np.ndarray):
+        """Top-k kandidat yang lolos filter (bitset mask), dengan ekspansi kandidat adaptif."""
+        mask[idx] = False
+        if isinstance(self.hybrid_sim, NeighborGraph):
+            if weights.is_build_mix:
+                # 1. Tetangga graf yang lolos filter (gratis); cukup jika jumlahnya >= k
+                indices, scores = self.hybrid_sim.neighbors(idx)
+                keep = mask[indices]
+                content = self._content()
+                if keep.sum() >= k or content is None:
+                    return indices[keep][:k], scores[keep][:k]
+            else:
+                content = self._exact_content()
+            # 2. Ekspansi (atau bobot kustom): skor exact hanya untuk himpunan produk yang lolos filter
+            allowed = np.flatnonzero(mask)
+            scores = hybrid_scores(content, np.asarray(self.hybrid_sim.angles, dtype=np.float64), idx, allowed, weights)
+        elif isinstance(self.hybrid_sim, LazyHybridSimilarity):
+            allowed = np.flatnonzero(mask)
+            scores = hybrid_scores(self.hybrid_sim.content, self.hybrid_sim.angles, idx, allowed, weights)
+        else:
+            allowed = np.flatnonzero(mask)
+            scores = self._dense_rows(idx, weights)[allowed]
+
+        k = min(k, len(allowed))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        top_idx, top_scores = select_top_k(np.asarray(scores, dtype=np.float64)[np.newaxis, :], k)
+        return allowed[top_idx[0]], top_scores[0]
+
+    def similarity_block(self, rows, weights: HybridWeights | None = None) -> np.ndarray:
+        """Hybrid Similarity exact antar produk rows (len(rows) x len(rows)), mis. untuk heatmap.
+
+        Mode graph dihitung dari content + sudut numerik, bukan dari graf (pasangan di luar top-K tidak tersimpan).
+        """
+        weights = weights or DEFAULT_WEIGHTS
+        rows = np.asarray(rows, dtype=np.int64)
+        if isinstance(self.hybrid_sim, NeighborGraph):
+            content = self._exact_content()
+            angles = np.asarray(self.hybrid_sim.angles, dtype=np.float64)
+            return np.array([hybrid_scores(content, angles, idx, rows, weights) for idx in rows]).reshape(len(rows), -1)
+        if isinstance(self.hybrid_sim, LazyHybridSimilarity):
+            return self.hybrid_sim.rows(rows, weights)[:, rows]
+        return self._dense_rows(rows, weights)[:, rows]
+
+    def has_product(self, product_name: str) -> bool:
+        """True jika nama (atau nama varian) cocok persis dengan produk di katalog."""
+        product_name = product_name.strip().lower()
+        return self.variant_names.get(product_name, product_name) in self.name_to_idx
+
+    def search(self, query: str, n: int = 5, weights: HybridWeights | None = None,
+               columns: list[str] | None = None, compact: bool = False, filters: RecommendationFilter | None = None):
+        """Pencarian teks bebas tanpa LLM: query ditransformasi vectorizer TF-IDF yang sudah di-fit.
+
+        Similarity = cosine query vs katalog (satu sparse mat-vec, atau embedding SVD jika dipakai),
+        lalu di-rerank dengan prior popularitas sesuai weights (rating=review=0 untuk teks murni).
+        """
+        if self.vectorizer is None:
+            raise ValueError("Recommender dibuat tanpa vectorizer; pencarian teks bebas tidak tersedia.")
+        weights = weights or DEFAULT_WEIGHTS
+
+        # 1. Skor query terhadap seluruh katalog
+        query_vec = self.vectorizer.transform([query])
+        if query_vec.nnz == 0:
+            return f"❌ Tidak ada kata dari '{query}' yang dikenali di dataset."
+        if self.svd is not None:
+            query_vec = normalize(self.svd.transform(query_vec)).ravel().astype(np.float32)
+            similarity = np.asarray(self.embedding @ query_vec, dtype=np.float64)
+        else:
+            similarity = self.tfidf_matrix @ query_vec.toarray().ravel()
+
+        # 2. Kandidat: top-(n + CANDIDATE_EXTRA) produk yang berbagi term dengan query (dan lolos filter)
+        matched = similarity > 0
+        if filters is not None and not filters.is_empty:
+            matched &= self.filter_index.mask(filters)
+        matched = np.flatnonzero(matched)
+        if len(matched) == 0:
+            return f"❌ Tidak ada produk yang cocok dengan '{query}'."
+        top_idx, top_scores = select_top_k(similarity[matched][np.newaxis, :], min(n + CANDIDATE_EXTRA, len(matched)))
+        return self._rerank(matched[top_idx[0]], top_scores[0], n, weights, columns, compact)
+
+    def _rerank(self, candidates: np.ndarray, similarity: np.ndarray, n: int, weights: HybridWeights,
+                columns: list[str] | None, compact: bool):
+        """Menghitung final score kandidat, mengambil top-n, lalu membungkus hasilnya."""
+        # Hitung Final Score (array kandidat saja)
+        candidates = np.asarray(candidates, dtype=np.int64)
+        similarity = np.asarray(similarity, dtype=np.float64)
+        final_score = self._final_scores(candidates, similarity, weights)
+
+        # Urutkan dan ambil top-n, baru kemudian sentuh DataFrame (hanya kolom yang diminta)
+        top = np.argsort(-final_score, kind='stable')[:n]
+        rows = candidates[top]
+        result = RecommendationResult(
+            self.df, rows, final_score[top], similarity[top], self.priors[rows, 0], self.priors[rows, 1], columns,
         )
+        return result if compact else result.to_frame()
+
+    def _final_scores(self, candidates: np.ndarray, similarity: np.ndarray, weights: HybridWeights) -> np.ndarray:
+        """Final Score: 40% Similarity + 30% Rating + 30% Review (default), dari prior popularitas."""
+        priors = self.priors[candidates]
+        return weights.similarity * similarity + weights.rating * priors[..., 0] + weights.review * priors[..., 1]
+
+    def _candidate_block(self, rows: np.ndarray, k: int, weights: HybridWeights):
+        """Top-k kandidat (tanpa produk acuan) untuk banyak baris sekaligus: array (len(rows), k)."""
+        if isinstance(self.hybrid_sim, NeighborGraph):
+            k = min(k, len(self.hybrid_sim) - 1)
+            # Graf hanya menyimpan top-K campuran build: campuran lain, atau k > K (jika content tersedia),
+            # dinilai exact terhadap seluruh katalog agar pool rerank tidak terpotong di K
+            if not weights.is_build_mix or (k > self.hybrid_sim.top_k and self._content() is not None):
+                if k <= 0:
+                    return np.empty((len(rows), 0), dtype=np.int64), np.empty((len(rows), 0))
+                angles = np.asarray(self.hybrid_sim.angles, dtype=np.float64)
+                return hybrid_neighbors_for_rows(self._exact_content(), angles, rows, k, weights=weights)
+        if isinstance(self.hybrid_sim, (NeighborGraph, LazyHybridSimilarity)):
+            return self.hybrid_sim.neighbors_block(rows, k, weights)
+        block = self._dense_rows(rows, weights)
+        block[np.arange(len(rows)), rows] = -np.inf
+        return select_top_k(block, min(k, block.shape[1] - 1))
+
+    def get_recommendations_batch(self, seeds=None, n: int = 5, weights: HybridWeights | None = None,
+                                  block_size: int = 512) -> pd.DataFrame:
+        """Rekomendasi untuk banyak produk acuan sekaligus (mis. job malam), format panjang (seed, rank, item, score).
+
+        seeds: daftar nama produk (di-resolve seperti get_recommendations); None = seluruh katalog.
+        seed & item berupa indeks baris katalog (int64, posisi di self.df), bukan nama: nama bisa duplikat,
+        sedangkan baris dapat dipetakan ke kolom apa pun (mis. self.df['ProdID'].to_numpy()[item]).
+        Kandidat dipilih per blok baris dengan satu operasi matriks; DataFrame hanya dibuat di akhir.
+        """
+        weights = weights or DEFAULT_WEIGHTS
+
+        # 1. Resolve semua seed sekali di awal
+        if seeds is None:
+            seed_rows = np.arange(len(self.df))
+        else:
+            resolved = [self._resolve_product(name) for name in seeds]
+            seed_rows = np.array([idx for idx in resolved if idx is not None], dtype=np.int64)
+            if len(seed_rows) < len(resolved):
+                logger.warning(f"{len(resolved) - len(seed_rows)} seed tidak ditemukan di dataset dan dilewati.")
+
+        # 2. Top-k kandidat + final score per blok seed
+        empty = np.empty(0, dtype=np.int64)
+        seed_parts, rank_parts, item_parts, score_parts = [empty], [empty], [empty], [np.empty(0)]
+        for start in range(0, len(seed_rows), block_size):
+            rows = seed_rows[start:start + block_size]
+            candidates, similarity = self._candidate_block(rows, n + CANDIDATE_EXTRA, weights)
+            final_score = self._final_scores(candidates, similarity, weights)
+            top = np.argsort(-final_score, axis=1, kind='stable')[:, :n]
+            seed_parts.append(np.repeat(rows, top.shape[1]))
+            rank_parts.append(np.tile(np.arange(1, top.shape[1] + 1), len(rows)))
+            item_parts.append(np.take_along_axis(candidates, top, axis=1).ravel())
+            score_parts.append(np.take_along_axis(final_score, top, axis=1).ravel())
 
-        # 4. Urutkan dan ambil top-n
-        results = results.sort_values('final_score', ascending=False)
-        recommended = results[['Name','Brand','Category','Rating','ReviewCount','final_score','Description']].head(n)
-        
-        return recommended
\ No newline at end of file
+        # 3. Hasil ringkas: satu baris per (seed, rank)
+        return pd.DataFrame({
+            'seed': np.concatenate(seed_parts).astype(np.int64),
+            'rank': np.concatenate(rank_parts),
+            'item': np.concatenate(item_parts).astype(np.int64),
+            'score': np.concatenate(score_parts),
+        })
\ No newline at end of file
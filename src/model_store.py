@@ -0,0 +1,289 @@
+# src/model_store.py
+
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import hashlib
+import joblib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from src.data_loader import load_local_data
+from src.preprocessing import clean_and_handle_missing_values, collapse_near_duplicates
+from src.feature_engineering import compute_popularity_priors, create_features, reduce_tfidf
+from src.modelling import (
+    CANDIDATE_EXTRA, NeighborGraph, QuantizedScores, ServingTable, build_hybrid_neighbors_parallel, build_serving_table,
+    calculate_evaluation_metrics,
+)
+from src.ann_index import build_ann_neighbors, build_partitioned_neighbors
+
+logger = logging.getLogger(__name__)
+
+# Naikkan jika format file artefak berubah, agar artefak lama tidak dipakai lagi
+MODEL_FORMAT_VERSION = 3
+DEFAULT_ARTIFACT_DIR = 'artifacts'
+# Tetangga per produk: n maksimum yang bisa diminta UI (50) + CANDIDATE_EXTRA, agar pool rerank tidak terpotong
+DEFAULT_TOP_K = 50 + CANDIDATE_EXTRA
+
+@dataclass
+class ModelArtifact:
+    """Bundel model (katalog bersih, TF-IDF, graf tetangga, transformer) yang dapat disimpan & dimuat ulang."""
+    version: str
+    df: pd.DataFrame
+    tfidf_matrix: sparse.csr_matrix
+    graph: NeighborGraph
+    vectorizer: object
+    scaler: object
+    review_log_max: float
+    metrics: dict = field(default_factory=dict)
+    path: str | None = None
+    # Opsional: embedding SVD float32 (reduce_tfidf) & model SVD-nya
+    embedding: np.ndarray | None = None
+    svd: object | None = None
+    # Opsional: varian near-duplicate yang digabung ke produk kanonik (collapse_near_duplicates)
+    variants: pd.DataFrame | None = None
+    # Threshold dedup saat build, dipakai ulang add_products untuk listing baru (None = tanpa dedup)
+    dedup_threshold: float | None = None
+    # Prior popularitas float32 (N, 2): [rating_norm, review_norm] untuk final score
+    priors: np.ndarray | None = None
+    # Opsional: tabel top-N siap saji per produk (build_serving_table)
+    serving: ServingTable | None = None
+
+def compute_model_version(data_path: str, params: dict) -> str:
+    """Versi artefak = hash isi CSV + parameter build + versi format."""
+    digest = hashlib.sha256()
+    with open(data_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    digest.update(json.dumps({'format': MODEL_FORMAT_VERSION, **params}, sort_keys=True).encode())
+    return digest.hexdigest()[:12]
+
+def artifact_version(data_path: str, top_k: int = DEFAULT_TOP_K, neighbor_method: str = 'exact',
+                     embedding_dim: int | None = None, score_dtype: str = 'auto', dedup_threshold: float | None = None,
+                     serving_top_n: int | None = 20, ann_params: dict | None = None) -> str:
+    """Versi artefak yang dipakai load_or_build_artifact untuk CSV & parameter build yang sama."""
+    params = {'top_k': top_k, 'neighbor_method': neighbor_method, 'embedding_dim': embedding_dim,
+              'score_dtype': score_dtype, 'dedup_threshold': dedup_threshold, 'serving_top_n': serving_top_n,
+              'ann_params': ann_params or None}
+    return compute_model_version(data_path, params)
+
+def build_model_artifact(df_raw: pd.DataFrame, version: str, top_k: int = DEFAULT_TOP_K, n_workers: int | None = None,
+                         neighbor_method: str = 'exact', embedding_dim: int | None = None,
+                         score_dtype: str = 'auto', dedup_threshold: float | None = None,
+                         serving_top_n: int | None = 20, ann_params: dict | None = None) -> ModelArtifact:
+    """Menjalankan pipeline lengkap (cleaning, fitur, graf tetangga, metrik) dari data mentah.
+
+    neighbor_method: 'exact' (blocked, paralel), 'ann' (LSH aproksimatif, lihat ann_recall_report),
+    atau 'partitioned' (exact per Category + kandidat lintas kategori dari LSH).
+    embedding_dim: jika diisi, content similarity dihitung di embedding SVD berdimensi ini, bukan TF-IDF mentah.
+    score_dtype: penyimpanan skor graf ('auto', 'float32', 'float16', 'int8'), lihat NeighborGraph.quantize.
+    dedup_threshold: jika diisi, listing near-duplicate digabung dulu sehingga model hanya memuat produk kanonik.
+    serving_top_n: lebar serving table top-N (None = tidak dibuat); rekomendasi default dilayani dari tabel ini.
+    ann_params: setting LSH untuk 'ann'/'partitioned', format seperti ann_recall_report (n_components, n_bits,
+    n_tables), ditambah numeric_candidates ('ann') atau cross_k ('partitioned').
+    """
+    df = clean_and_handle_missing_values(df_raw)
+    variants = None
+    if dedup_threshold is not None:
+        df, variants = collapse_near_duplicates(df, threshold=dedup_threshold)
+    df, tfidf_matrix, vectorizer, scaler = create_features(df, return_transformers=True)
+
+    embedding, svd = reduce_tfidf(tfidf_matrix, embedding_dim) if embedding_dim else (None, None)
+    content = embedding if embedding is not None else tfidf_matrix
+    lsh_params = dict(ann_params or {})
+    if neighbor_method == 'exact' and lsh_params:
+        raise ValueError("ann_params hanya berlaku untuk neighbor_method 'ann' atau 'partitioned'.")
+    if neighbor_method == 'exact':
+        graph = build_hybrid_neighbors_parallel(df, content, top_k=top_k, n_workers=n_workers)
+    elif neighbor_method == 'ann':
+        numeric_candidates = lsh_params.pop('numeric_candidates', 200)
+        graph = build_ann_neighbors(df, content, top_k=top_k, numeric_candidates=numeric_candidates,
+                                    lsh_params=lsh_params)
+    elif neighbor_method == 'partitioned':
+        cross_k = lsh_params.pop('cross_k', 10)
+        graph = build_partitioned_neighbors(df, content, top_k=top_k, cross_k=cross_k, lsh_params=lsh_params)
+    else:
+        raise ValueError(f"neighbor_method tidak dikenal: {neighbor_method}")
+    metrics = calculate_evaluation_metrics(df, graph)
+    if score_dtype != 'float32':
+        graph = graph.quantize(score_dtype)
+    priors = compute_popularity_priors(df)
+    # Dibangun dari graf final (setelah kuantisasi) agar identik dengan jalur live
+    serving = build_serving_table(graph, priors, serving_top_n) if serving_top_n else None
+
+    return ModelArtifact(
+        version=version,
+        df=df,
+        tfidf_matrix=tfidf_matrix.tocsr(),
+        graph=graph,
+        vectorizer=vectorizer,
+        scaler=scaler,
+        review_log_max=float(df['review_log'].max()),
+        metrics=metrics,
+        embedding=embedding,
+        svd=svd,
+        variants=variants,
+        dedup_threshold=dedup_threshold,
+        priors=priors,
+        serving=serving,
+    )
+
+def _save_scores(tmp_dir: str, name: str, scores):
+    """Menyimpan skor graf; skor 8-bit disimpan bersama skala & offset per barisnya."""
+    if isinstance(scores, QuantizedScores):
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), scores.values)
+        np.save(os.path.join(tmp_dir, f'{name}_scale.npy'), scores.scale)
+        np.save(os.path.join(tmp_dir, f'{name}_offset.npy'), scores.offset)
+    else:
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), scores)
+
+def _load_scores(path: str, name: str, mmap_mode):
+    values = np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+    scale_path = os.path.join(path, f'{name}_scale.npy')
+    if os.path.exists(scale_path):
+        return QuantizedScores(values, np.load(scale_path, mmap_mode=mmap_mode),
+                               np.load(os.path.join(path, f'{name}_offset.npy'), mmap_mode=mmap_mode))
+    return values
+
+def save_model_artifact(artifact: ModelArtifact, artifact_root: str = DEFAULT_ARTIFACT_DIR) -> str:
+    """Menyimpan artefak ke <artifact_root>/<version>/ secara atomik; mengembalikan path direktorinya."""
+    os.makedirs(artifact_root, exist_ok=True)
+    target = os.path.join(artifact_root, artifact.version)
+
+    # Tulis ke direktori sementara lalu rename, agar replika lain tidak membaca artefak setengah jadi
+    tmp_dir = tempfile.mkdtemp(prefix=f".{artifact.version}-", dir=artifact_root)
+    try:
+        artifact.df.to_pickle(os.path.join(tmp_dir, 'catalog.pkl'))
+        sparse.save_npz(os.path.join(tmp_dir, 'tfidf.npz'), artifact.tfidf_matrix, compressed=False)
+        np.save(os.path.join(tmp_dir, 'neighbor_indices.npy'), artifact.graph.indices)
+        _save_scores(tmp_dir, 'neighbor_scores', artifact.graph.scores)
+        np.save(os.path.join(tmp_dir, 'numeric_angles.npy'), artifact.graph.angles)
+        priors = artifact.priors if artifact.priors is not None else compute_popularity_priors(artifact.df)
+        np.save(os.path.join(tmp_dir, 'popularity_priors.npy'), priors)
+        if artifact.serving is not None:
+            np.save(os.path.join(tmp_dir, 'serving_rows.npy'), artifact.serving.rows)
+            np.save(os.path.join(tmp_dir, 'serving_similarity.npy'), artifact.serving.similarity)
+            np.save(os.path.join(tmp_dir, 'serving_ranks.npy'), artifact.serving.ranks)
+        joblib.dump(artifact.vectorizer, os.path.join(tmp_dir, 'vectorizer.joblib'))
+        joblib.dump(artifact.scaler, os.path.join(tmp_dir, 'scaler.joblib'))
+        if artifact.embedding is not None:
+            np.save(os.path.join(tmp_dir, 'embedding.npy'), artifact.embedding)
+            joblib.dump(artifact.svd, os.path.join(tmp_dir, 'svd.joblib'))
+        if artifact.variants is not None:
+            artifact.variants.to_pickle(os.path.join(tmp_dir, 'variants.pkl'))
+
+        manifest = {
+            'format_version': MODEL_FORMAT_VERSION,
+            'version': artifact.version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'n_products': len(artifact.df),
+            'top_k': artifact.graph.top_k,
+            'score_dtype': artifact.graph.score_dtype,
+            'embedding_dim': None if artifact.embedding is None else artifact.embedding.shape[1],
+            'n_variants': None if artifact.variants is None else len(artifact.variants),
+            'dedup_threshold': artifact.dedup_threshold,
+            'serving_top_n': None if artifact.serving is None else artifact.serving.top_n,
+            'scaler': {
+                'columns': ['Rating', 'ReviewCount'],
+                'data_min': artifact.scaler.data_min_.tolist(),
+                'data_max': artifact.scaler.data_max_.tolist(),
+                'review_log_max': artifact.review_log_max,
+            },
+            'metrics': artifact.metrics,
+        }
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        if os.path.exists(target):
+            # Versi yang sama sudah ditulis proses lain
+            shutil.rmtree(tmp_dir)
+        else:
+            os.rename(tmp_dir, target)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"Artefak model disimpan di: {target}")
+    artifact.path = target
+    return target
+
+def load_model_artifact(path: str, mmap: bool = True) -> ModelArtifact:
+    """Memuat artefak; array tetangga di-memory-map sehingga dibagi antar proses di host yang sama."""
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != MODEL_FORMAT_VERSION:
+        raise ValueError(f"Format artefak {path} tidak didukung: {manifest.get('format_version')}")
+
+    mmap_mode = 'r' if mmap else None
+    graph = NeighborGraph(
+        np.load(os.path.join(path, 'neighbor_indices.npy'), mmap_mode=mmap_mode),
+        _load_scores(path, 'neighbor_scores', mmap_mode),
+        np.load(os.path.join(path, 'numeric_angles.npy'), mmap_mode=mmap_mode),
+    )
+
+    embedding, svd = None, None
+    if manifest.get('embedding_dim'):
+        embedding = np.load(os.path.join(path, 'embedding.npy'), mmap_mode=mmap_mode)
+        svd = joblib.load(os.path.join(path, 'svd.joblib'))
+    variants_path = os.path.join(path, 'variants.pkl')
+    variants = pd.read_pickle(variants_path) if os.path.exists(variants_path) else None
+    df = pd.read_pickle(os.path.join(path, 'catalog.pkl'))
+    priors_path = os.path.join(path, 'popularity_priors.npy')
+    priors = np.load(priors_path, mmap_mode=mmap_mode) if os.path.exists(priors_path) else compute_popularity_priors(df)
+    serving = None
+    if manifest.get('serving_top_n'):
+        serving = ServingTable(
+            np.load(os.path.join(path, 'serving_rows.npy'), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, 'serving_similarity.npy'), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, 'serving_ranks.npy'), mmap_mode=mmap_mode),
+            manifest['serving_top_n'],
+        )
+
+    logger.info(f"Artefak model dimuat dari: {path} ✅ ({manifest['n_products']} produk)")
+    return ModelArtifact(
+        version=manifest['version'],
+        df=df,
+        tfidf_matrix=sparse.load_npz(os.path.join(path, 'tfidf.npz')).tocsr(),
+        graph=graph,
+        vectorizer=joblib.load(os.path.join(path, 'vectorizer.joblib')),
+        scaler=joblib.load(os.path.join(path, 'scaler.joblib')),
+        review_log_max=manifest['scaler']['review_log_max'],
+        metrics=manifest.get('metrics', {}),
+        path=path,
+        embedding=embedding,
+        svd=svd,
+        variants=variants,
+        dedup_threshold=manifest.get('dedup_threshold'),
+        priors=priors,
+        serving=serving,
+    )
+
+def load_or_build_artifact(data_path: str, artifact_root: str = DEFAULT_ARTIFACT_DIR, top_k: int = DEFAULT_TOP_K,
+                           n_workers: int | None = None, neighbor_method: str = 'exact',
+                           embedding_dim: int | None = None, score_dtype: str = 'auto',
+                           dedup_threshold: float | None = None, serving_top_n: int | None = 20,
+                           ann_params: dict | None = None) -> ModelArtifact:
+    """Memuat artefak untuk versi data saat ini, atau membangun & menyimpannya jika belum ada."""
+    version = artifact_version(data_path, top_k=top_k, neighbor_method=neighbor_method, embedding_dim=embedding_dim,
+                               score_dtype=score_dtype, dedup_threshold=dedup_threshold, serving_top_n=serving_top_n,
+                               ann_params=ann_params)
+    path = os.path.join(artifact_root, version)
+
+    if not os.path.exists(os.path.join(path, 'manifest.json')):
+        logger.info(f"Artefak versi {version} belum ada. Membangun model dari {data_path}...")
+        df_raw = load_local_data(data_path)
+        if df_raw.empty:
+            raise ValueError(f"Dataset '{data_path}' kosong atau gagal dimuat.")
+        artifact = build_model_artifact(df_raw, version, top_k=top_k, n_workers=n_workers,
+                                        neighbor_method=neighbor_method, embedding_dim=embedding_dim,
+                                        score_dtype=score_dtype, dedup_threshold=dedup_threshold,
+                                        serving_top_n=serving_top_n, ann_params=ann_params)
+        save_model_artifact(artifact, artifact_root)
+
+    # Selalu muat dari disk agar array tetangga memakai halaman memori bersama (mmap)
+    return load_model_artifact(path)
@@ -2,11 +2,91 @@
 
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
 import logging
+import os
+import sys
 
 logger = logging.getLogger(__name__)
 
+# Bobot kombinasi Hybrid Similarity
+CONTENT_WEIGHT = 0.4
+NUMERIC_WEIGHT = 0.6
+
+@dataclass(frozen=True)
+class HybridWeights:
+    """Bobot hybrid yang dapat diatur per request.
+
+    similarity  = content * content_sim + numeric * numeric_sim
+    final_score = similarity * similarity + rating * rating_norm + review * review_norm
+
+    Graf top-K & matriks padat hanya berlaku untuk campuran content/numeric saat build; campuran lain
+    dinilai exact terhadap representasi content (TF-IDF/embedding) + sudut numerik.
+    """
+    content: float = CONTENT_WEIGHT
+    numeric: float = NUMERIC_WEIGHT
+    similarity: float = 0.4
+    rating: float = 0.3
+    review: float = 0.3
+
+    @property
+    def is_build_mix(self) -> bool:
+        """True jika campuran content/numeric sama dengan bobot saat build."""
+        return self.content == CONTENT_WEIGHT and self.numeric == NUMERIC_WEIGHT
+
+DEFAULT_WEIGHTS = HybridWeights()
+
+# Kandidat tambahan di atas n sebelum rerank final score: top-(n + CANDIDATE_EXTRA) similarity
+CANDIDATE_EXTRA = 19
+
+# Fitur numerik yang dipakai model (hasil create_features)
+NUMERIC_COLUMNS = ['Rating_scaled', 'ReviewCount_scaled_log']
+
+def compute_numeric_angles(num_features: np.ndarray) -> np.ndarray:
+    """Merepresentasikan fitur numerik 2-D sebagai sudut (radian); vektor nol menjadi NaN."""
+    num_features = np.asarray(num_features, dtype=np.float64)
+    x, y = num_features[:, 0], num_features[:, 1]
+    angles = np.arctan2(y, x)
+    angles[(x == 0) & (y == 0)] = np.nan
+    return angles
+
+def numeric_similarity(angles_a, angles_b) -> np.ndarray:
+    """Cosine similarity numerik closed-form: cos(sudut_a - sudut_b), vektor nol bernilai 0."""
+    sim = np.cos(np.subtract.outer(angles_a, angles_b))
+    return np.nan_to_num(sim, nan=0.0)
+
+class NumericAngleIndex:
+    """Indeks sudut terurut untuk mencari tetangga numerik terdekat dengan binary search."""
+
+    def __init__(self, angles: np.ndarray):
+        self.angles = angles
+        # Vektor nol (NaN) tidak mirip dengan produk mana pun, jadi tidak diindeks
+        valid = np.flatnonzero(~np.isnan(angles))
+        self.order = valid[np.argsort(angles[valid], kind='stable')]
+        self.sorted_angles = angles[self.order]
+
+    def nearest(self, angle: float, k: int, exclude: int | None = None):
+        """Mengembalikan (indeks, skor numerik) k produk dengan sudut terdekat, O(log N + k log k)."""
+        if np.isnan(angle) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # k terdekat pasti berada dalam jendela k+1 elemen di kiri/kanan posisi sisipan
+        pos = np.searchsorted(self.sorted_angles, angle)
+        lo, hi = max(pos - k - 1, 0), min(pos + k + 1, len(self.order))
+        window = self.order[lo:hi]
+        diff = np.abs(self.sorted_angles[lo:hi] - angle)
+        if exclude is not None:
+            keep = window != exclude
+            window, diff = window[keep], diff[keep]
+
+        pick = np.argsort(diff, kind='stable')[:k]
+        return window[pick].astype(np.int64), np.cos(diff[pick])
+
 def build_hybrid_model(df: pd.DataFrame, tfidf_matrix) -> np.ndarray:
     """Membangun matriks Hybrid Similarity."""
     logger.info("Membangun Hybrid Model (Similarity Matrix)...")
@@ -14,37 +94,532 @@ def build_hybrid_model(df: pd.DataFrame, tfidf_matrix) -> np.ndarray:
     # 1. Content-based similarity (dari TF-IDF)
     content_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
 
-    # 2. Numeric similarity (dari Rating dan ReviewCount scaled log)
-    num_features = df[['Rating_scaled', 'ReviewCount_scaled_log']].values
-    numeric_sim = cosine_similarity(num_features, num_features)
+    # 2. Numeric similarity (dari Rating dan ReviewCount scaled log), closed-form dari sudut
+    angles = compute_numeric_angles(df[NUMERIC_COLUMNS].values)
 
-    # 3. Hybrid similarity (kombinasi 40% Content, 60% Numeric)
-    hybrid_sim = 0.4 * content_sim + 0.6 * numeric_sim
+    # 3. Hybrid similarity (kombinasi 40% Content, 60% Numeric), ditulis in-place per blok
+    #    agar tidak ada matriks numeric N x N terpisah
+    hybrid_sim = content_sim
+    hybrid_sim *= CONTENT_WEIGHT
+    for start in range(0, len(angles), 1024):
+        stop = min(start + 1024, len(angles))
+        hybrid_sim[start:stop] += NUMERIC_WEIGHT * numeric_similarity(angles[start:stop], angles)
     
     logger.info(f"Hybrid Similarity matrix shape: {hybrid_sim.shape}")
     return hybrid_sim
 
-def calculate_evaluation_metrics(df: pd.DataFrame, hybrid_sim: np.ndarray) -> dict:
-    """Menghitung rata-rata similarity top-K untuk evaluasi model global."""
-    results = []
+class _RowAccessMixin:
+    """Akses seperti ndarray (sim[i] dan sim[np.ix_(rows, cols)]) di atas method row/rows."""
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, cols = key
+            return self.rows(rows)[:, np.asarray(cols).ravel()]
+        return self.row(key)
+
+class QuantizedScores:
+    """Skor 8-bit affine per baris (kode uint8, skor = offset + kode * scale); didekuantisasi ke float32 saat dibaca.
+
+    Offset = skor minimum baris, sehingga 256 level hanya mencakup rentang skor top-K baris itu (bukan [-max, max]).
+    """
+
+    def __init__(self, values: np.ndarray, scale: np.ndarray, offset: np.ndarray):
+        self.values = values
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def from_scores(cls, scores: np.ndarray) -> 'QuantizedScores':
+        scores = np.asarray(scores, dtype=np.float32)
+        if scores.shape[1]:
+            offset, top = scores.min(axis=1), scores.max(axis=1)
+        else:
+            offset = top = np.zeros(len(scores), dtype=np.float32)
+        scale = ((top - offset) / 255).astype(np.float32)
+        safe_scale = np.where(scale > 0, scale, 1.0)
+        values = np.round((scores - offset[:, np.newaxis]) / safe_scale[:, np.newaxis]).astype(np.uint8)
+        return cls(values, scale, offset.astype(np.float32))
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.scale.nbytes + self.offset.nbytes
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, key):
+        row_key, col_key = key if isinstance(key, tuple) else (key, slice(None))
+        values = np.asarray(self.values[row_key])[..., col_key].astype(np.float32)
+        scale = np.asarray(self.scale[row_key], dtype=np.float32)
+        offset = np.asarray(self.offset[row_key], dtype=np.float32)
+        if scale.ndim:
+            scale, offset = scale[..., np.newaxis], offset[..., np.newaxis]
+        return offset + values * scale
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self[:]
+        return dense if dtype is None else dense.astype(dtype)
+
+def _score_storage(scores) -> str:
+    return 'int8' if isinstance(scores, QuantizedScores) else np.dtype(scores.dtype).name
+
+class NeighborGraph(_RowAccessMixin):
+    """Graf tetangga top-K per produk (pengganti matriks N x N yang padat)."""
+
+    def __init__(self, indices: np.ndarray, scores: np.ndarray, angles: np.ndarray | None = None):
+        # indices[i] & scores[i]: K tetangga terdekat produk i menurut bobot build, terurut menurun
+        # (tanpa produk i sendiri)
+        self.indices = indices
+        self.scores = scores
+        # Sudut numerik per produk, untuk skor exact dengan bobot lain (lihat hybrid_scores)
+        self.angles = angles
+
+    @property
+    def shape(self) -> tuple:
+        n = self.indices.shape[0]
+        return (n, n)
+
+    @property
+    def top_k(self) -> int:
+        return self.indices.shape[1]
+
+    def __len__(self) -> int:
+        return self.indices.shape[0]
+
+    @property
+    def score_dtype(self) -> str:
+        """Format penyimpanan skor: 'float32', 'float16', atau 'int8' (kode 8-bit dengan offset & skala per baris)."""
+        return _score_storage(self.scores)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.indices, self.scores, self.angles]
+        return sum(arr.nbytes for arr in arrays if arr is not None)
+
+    def quantize(self, score_dtype: str = 'auto') -> 'NeighborGraph':
+        """Membuat salinan graf dengan dtype ringkas: indeks uint16/int32, skor float16/int8.
+
+        'auto' memilih berdasarkan ukuran katalog: float16 untuk N < 65536, int8 untuk katalog lebih besar.
+        """
+        n_products = len(self)
+        if score_dtype == 'auto':
+            score_dtype = 'float16' if n_products < 65536 else 'int8'
+        if score_dtype not in ('float32', 'float16', 'int8'):
+            raise ValueError(f"score_dtype tidak dikenal: {score_dtype}")
+
+        # Graf selalu penuh (tanpa sentinel), jadi uint16 cukup selama indeks < 65536
+        index_dtype = np.uint16 if n_products <= 65536 else np.int32
+
+        def convert(scores):
+            if score_dtype == 'int8':
+                return QuantizedScores.from_scores(np.asarray(scores))
+            return np.asarray(scores, dtype=score_dtype)
+
+        graph = NeighborGraph(
+            np.asarray(self.indices, dtype=index_dtype), convert(self.scores),
+            None if self.angles is None else np.asarray(self.angles, dtype=np.float32),
+        )
+        logger.info(f"Neighbor graph dikompresi ({score_dtype}): {self.nbytes / 1024**2:.1f} MB -> {graph.nbytes / 1024**2:.1f} MB")
+        return graph
+
+    def neighbors(self, idx: int, k: int | None = None, weights: HybridWeights | None = None):
+        """Mengembalikan (indeks, skor) tetangga produk idx, terurut menurun.
+
+        Graf hanya menyimpan top-K untuk campuran content/numeric saat build; weights dengan campuran lain
+        ditolak (ValueError) karena tetangga terbaiknya bisa berada di luar K yang tersimpan.
+        """
+        indices, scores = self.neighbors_block(np.array([idx]), k, weights)
+        return indices[0], scores[0]
+
+    def neighbors_block(self, rows: np.ndarray, k: int | None = None, weights: HybridWeights | None = None):
+        """Versi batch dari neighbors: array (len(rows), k) indeks & skor, terurut menurun per baris."""
+        if weights is not None and not weights.is_build_mix:
+            raise ValueError("Graf top-K hanya berlaku untuk bobot content/numeric saat build; gunakan skor exact.")
+        k = self.top_k if k is None else min(k, self.top_k)
+        return np.asarray(self.indices[rows, :k], dtype=np.int64), np.asarray(self.scores[rows, :k], dtype=np.float64)
+
+    def rows(self, indices) -> np.ndarray:
+        """Baris similarity versi padat: skor tetangga, 0 untuk pasangan di luar top-K."""
+        indices = np.asarray(indices).ravel()
+        dense = np.zeros((len(indices), len(self)), dtype=np.float64)
+        np.put_along_axis(dense, np.asarray(self.indices[indices], dtype=np.int64), np.asarray(self.scores[indices]), axis=1)
+        return dense
+
+    def row(self, idx: int) -> np.ndarray:
+        return self.rows([idx])[0]
+
+def prepare_content(content_matrix):
+    """Normalisasi L2 representasi content: TF-IDF sparse (CSR) atau embedding padat (float32)."""
+    if sparse.issparse(content_matrix):
+        return normalize(content_matrix).tocsr()
+    return np.ascontiguousarray(normalize(content_matrix), dtype=np.float32)
+
+def content_row_vector(content, idx: int) -> np.ndarray:
+    """Mengambil satu baris content sebagai vektor padat 1-D."""
+    row = content[idx]
+    return row.toarray().ravel() if sparse.issparse(row) else np.asarray(row, dtype=np.float64).ravel()
+
+def hybrid_scores(content, angles: np.ndarray, idx: int, cands: np.ndarray,
+                  weights: HybridWeights = DEFAULT_WEIGHTS) -> np.ndarray:
+    """Skor Hybrid Similarity exact produk idx terhadap kandidat cands (content sudah dinormalisasi L2)."""
+    content_sim = np.asarray(content[cands] @ content_row_vector(content, idx), dtype=np.float64)
+    return weights.content * content_sim + weights.numeric * numeric_similarity(angles[idx], angles[cands])
+
+class ServingTable:
+    """Tabel top-N siap saji per produk: urutan final score (rerank 0.4/0.3/0.3) sudah dihitung offline.
+
+    Per produk disimpan kandidat pool (top_n + CANDIDATE_EXTRA tetangga), terurut menurun menurut final score, beserta
+    similarity-nya dan peringkat similarity aslinya (ranks). Request top-n cukup mengambil entri dengan
+    rank < n + CANDIDATE_EXTRA, sehingga hasilnya identik dengan jalur live IntegratedRecommender untuk n <= top_n.
+    """
+
+    def __init__(self, rows: np.ndarray, similarity: np.ndarray, ranks: np.ndarray, top_n: int,
+                 weights: HybridWeights = DEFAULT_WEIGHTS):
+        self.rows = rows
+        self.similarity = similarity
+        self.ranks = ranks
+        self.top_n = top_n
+        self.weights = weights
+
+    def __len__(self) -> int:
+        return self.rows.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.similarity.nbytes + self.ranks.nbytes
+
+    def supports(self, n: int, weights: HybridWeights) -> bool:
+        """True jika request (n, weights) dapat dijawab langsung dari tabel."""
+        return n <= self.top_n and weights == self.weights
+
+    def lookup(self, idx: int, n: int):
+        """Mengembalikan (indeks, similarity) top-n produk idx, sudah terurut menurut final score."""
+        keep = np.asarray(self.ranks[idx]) < n + CANDIDATE_EXTRA
+        return (np.asarray(self.rows[idx], dtype=np.int64)[keep][:n],
+                np.asarray(self.similarity[idx], dtype=np.float64)[keep][:n])
+
+def build_serving_table(graph: NeighborGraph, priors: np.ndarray, top_n: int = 20,
+                        weights: HybridWeights = DEFAULT_WEIGHTS, block_size: int = 4096) -> ServingTable:
+    """Menghitung ServingTable dari graf tetangga & prior popularitas (compute_popularity_priors)."""
+    pool = min(top_n + CANDIDATE_EXTRA, graph.top_k)
+    n_products = len(graph)
+    logger.info(f"Membangun serving table top-{top_n} untuk {n_products} produk...")
+    rows = np.empty((n_products, pool), dtype=np.int32)
+    similarity = np.empty((n_products, pool), dtype=np.float32)
+    ranks = np.empty((n_products, pool), dtype=np.uint8 if pool <= 256 else np.uint16)
+
+    for start in range(0, n_products, block_size):
+        stop = min(start + block_size, n_products)
+        indices, scores = graph.neighbors_block(np.arange(start, stop), pool, weights)
+        # Rumus final score sama dengan IntegratedRecommender._final_scores
+        block_priors = priors[indices]
+        final_score = (weights.similarity * scores + weights.rating * block_priors[..., 0]
+                       + weights.review * block_priors[..., 1])
+        order = np.argsort(-final_score, axis=1, kind='stable')
+        rows[start:stop] = np.take_along_axis(indices, order, axis=1)
+        similarity[start:stop] = np.take_along_axis(scores, order, axis=1)
+        ranks[start:stop] = order
+
+    table = ServingTable(rows, similarity, ranks, top_n, weights)
+    logger.info(f"Serving table selesai: {rows.shape} ({table.nbytes / 1024**2:.1f} MB)")
+    return table
+
+def select_top_k(block: np.ndarray, k: int):
+    """Memilih k skor terbesar per baris (terurut menurun) menggunakan argpartition."""
+    part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(block, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+def hybrid_similarity_block(content, angles: np.ndarray, rows, weights: HybridWeights = DEFAULT_WEIGHTS) -> np.ndarray:
+    """Menghitung blok Hybrid Similarity (float64) untuk baris rows (slice atau array indeks)."""
+    block = content[rows] @ content.T
+    block = block.toarray() if hasattr(block, 'toarray') else np.asarray(block)
+    block *= weights.content
+    block += weights.numeric * numeric_similarity(angles[rows], angles)
+    return block
+
+def _hybrid_block_top_k(content, angles: np.ndarray, start: int, stop: int, k: int):
+    """Menghitung Hybrid Similarity untuk baris [start, stop) lalu mengambil top-k (tanpa diri sendiri)."""
+    block = hybrid_similarity_block(content, angles, slice(start, stop))
+
+    # Produk tidak boleh menjadi tetangga dirinya sendiri
+    rows = np.arange(stop - start)
+    block[rows, rows + start] = -np.inf
+    return select_top_k(block, k)
+
+def hybrid_neighbors_for_rows(content, angles: np.ndarray, rows: np.ndarray, k: int, block_size: int = 512,
+                              weights: HybridWeights = DEFAULT_WEIGHTS):
+    """Top-k tetangga exact untuk sekumpulan baris tertentu (content sudah dinormalisasi L2)."""
+    rows = np.asarray(rows, dtype=np.int64)
+    indices = np.empty((len(rows), k), dtype=np.int32)
+    scores = np.empty((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), block_size):
+        chunk = rows[start:start + block_size]
+        block = hybrid_similarity_block(content, angles, chunk, weights)
+        block[np.arange(len(chunk)), chunk] = -np.inf
+        indices[start:start + len(chunk)], scores[start:start + len(chunk)] = select_top_k(block, k)
+    return indices, scores
+
+def build_hybrid_neighbors(df: pd.DataFrame, tfidf_matrix, top_k: int = 50, block_size: int = 512) -> NeighborGraph:
+    """Membangun graf tetangga top-K Hybrid Similarity secara bertahap (per blok baris).
+
+    tfidf_matrix boleh diganti embedding padat (reduce_tfidf) untuk dot product yang lebih cepat.
+    """
+    n_products = tfidf_matrix.shape[0]
+    k = min(top_k, n_products - 1)
+    logger.info(f"Membangun Hybrid Model (Top-{k} Neighbor Graph, blok {block_size} baris)...")
+
+    # Normalisasi L2 sekali di awal, sehingga dot product = cosine similarity
+    content = prepare_content(tfidf_matrix)
+    angles = compute_numeric_angles(df[NUMERIC_COLUMNS].values)
+
+    indices = np.empty((n_products, max(k, 0)), dtype=np.int32)
+    scores = np.empty((n_products, max(k, 0)), dtype=np.float32)
+    if k > 0:
+        for start in range(0, n_products, block_size):
+            stop = min(start + block_size, n_products)
+            indices[start:stop], scores[start:stop] = _hybrid_block_top_k(content, angles, start, stop, k)
+
+    logger.info(f"Neighbor graph shape: {indices.shape}")
+    return NeighborGraph(indices, scores, angles)
+
+# State per worker process untuk build_hybrid_neighbors_parallel (diisi oleh _init_neighbor_worker)
+_WORKER_STATE = {}
+
+def _share_array(arr: np.ndarray):
+    """Menyalin array ke shared memory; mengembalikan (handle, spesifikasi untuk worker)."""
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def _init_neighbor_worker(array_specs, matrix_shape, angles):
+    """Initializer worker: memasang content dari shared memory (tanpa pickle per task)."""
+    handles = [shared_memory.SharedMemory(name=name) for name, _, _ in array_specs]
+    arrays = [
+        np.ndarray(shape, dtype=dtype, buffer=handle.buf)
+        for handle, (_, shape, dtype) in zip(handles, array_specs)
+    ]
+    _WORKER_STATE['handles'] = handles
+    if len(arrays) == 1:
+        # Embedding padat
+        _WORKER_STATE['content'] = arrays[0]
+    else:
+        # TF-IDF sparse: data, indices, indptr
+        _WORKER_STATE['content'] = sparse.csr_matrix(tuple(arrays), shape=matrix_shape, copy=False)
+    _WORKER_STATE['angles'] = angles
+
+def _neighbor_shard_worker(start: int, stop: int, k: int, block_size: int):
+    """Menghitung top-k tetangga untuk shard baris [start, stop) di dalam worker."""
+    content, angles = _WORKER_STATE['content'], _WORKER_STATE['angles']
+    indices = np.empty((stop - start, k), dtype=np.int32)
+    scores = np.empty((stop - start, k), dtype=np.float32)
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        indices[block_start - start:block_stop - start], scores[block_start - start:block_stop - start] = (
+            _hybrid_block_top_k(content, angles, block_start, block_stop, k)
+        )
+    return start, indices, scores
+
+def build_hybrid_neighbors_parallel(df: pd.DataFrame, tfidf_matrix, top_k: int = 50, n_workers: int | None = None,
+                                    block_size: int = 512) -> NeighborGraph:
+    """Membangun graf tetangga top-K secara paralel (ProcessPoolExecutor) dengan content di shared memory."""
+    n_workers = n_workers or os.cpu_count() or 1
+    n_products = tfidf_matrix.shape[0]
+    k = min(top_k, n_products - 1)
+    if n_workers <= 1 or k <= 0 or n_products <= block_size:
+        return build_hybrid_neighbors(df, tfidf_matrix, top_k=top_k, block_size=block_size)
+
+    logger.info(f"Membangun Hybrid Model (Top-{k} Neighbor Graph, {n_workers} proses)...")
+    content = prepare_content(tfidf_matrix)
+    angles = compute_numeric_angles(df[NUMERIC_COLUMNS].values)
+
+    # 1. Bagikan array CSR (atau embedding padat) lewat shared memory
+    arrays = (content.data, content.indices, content.indptr) if sparse.issparse(content) else (content,)
+    shared = [_share_array(arr) for arr in arrays]
+    handles = [handle for handle, _ in shared]
+    specs = [spec for _, spec in shared]
+
+    # 2. Bagi baris menjadi shard (beberapa per worker agar beban seimbang)
+    n_shards = n_workers * 4
+    shard_size = max(block_size, -(-n_products // n_shards))
+    bounds = [(start, min(start + shard_size, n_products)) for start in range(0, n_products, shard_size)]
+
+    indices = np.empty((n_products, k), dtype=np.int32)
+    scores = np.empty((n_products, k), dtype=np.float32)
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_neighbor_worker,
+                                 initargs=(specs, content.shape, angles)) as executor:
+            futures = [executor.submit(_neighbor_shard_worker, start, stop, k, block_size) for start, stop in bounds]
+
+            # 3. Gabungkan hasil tiap shard
+            for future in futures:
+                start, shard_indices, shard_scores = future.result()
+                indices[start:start + len(shard_indices)] = shard_indices
+                scores[start:start + len(shard_scores)] = shard_scores
+    finally:
+        for handle in handles:
+            handle.close()
+            handle.unlink()
+
+    logger.info(f"Neighbor graph shape: {indices.shape}")
+    return NeighborGraph(indices, scores, angles)
+
+def get_peak_rss_mb() -> float | None:
+    """Mengambil peak RSS proses dalam MB (None jika OS tidak mendukung, mis. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux melaporkan KB, macOS melaporkan byte
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def build_hybrid_model_blocked(df: pd.DataFrame, tfidf_matrix, memory_budget: int = 256 * 1024**2,
+                               dtype=np.float32) -> np.ndarray:
+    """Membangun matriks Hybrid Similarity per blok baris ke satu output float32/float16 yang sudah dialokasikan."""
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float16):
+        raise ValueError(f"dtype harus float32 atau float16, bukan {dtype}.")
+
+    n_products = tfidf_matrix.shape[0]
+    content = prepare_content(tfidf_matrix)
+    angles = compute_numeric_angles(df[NUMERIC_COLUMNS].values)
+
+    # memory_budget membatasi memori sementara per blok (di luar output):
+    # hasil sparse, blok float64 dan term numerik float64 -> maks ~32 byte per sel
+    block_size = min(max(1, int(memory_budget // (n_products * 32))), n_products)
+    logger.info(
+        f"Membangun Hybrid Model (blocked {dtype.name}, {block_size} baris/blok, "
+        f"output {n_products * n_products * dtype.itemsize / 1024**2:.1f} MB)..."
+    )
+
+    hybrid_sim = np.empty((n_products, n_products), dtype=dtype)
+    for start in range(0, n_products, block_size):
+        stop = min(start + block_size, n_products)
+        hybrid_sim[start:stop] = hybrid_similarity_block(content, angles, slice(start, stop))
+
+    peak_rss = get_peak_rss_mb()
+    if peak_rss is not None:
+        logger.info(f"Hybrid Similarity matrix shape: {hybrid_sim.shape}, peak RSS: {peak_rss:.1f} MB")
+    else:
+        logger.info(f"Hybrid Similarity matrix shape: {hybrid_sim.shape}")
+    return hybrid_sim
+
+class LazyHybridSimilarity(_RowAccessMixin):
+    """Hybrid Similarity yang dihitung per baris saat query (tanpa matriks N x N)."""
+
+    def __init__(self, tfidf_matrix, num_features: np.ndarray):
+        # Hanya menyimpan TF-IDF (sparse, atau embedding padat) & fitur numerik: memori O(nnz), bukan O(N^2)
+        self.content = prepare_content(tfidf_matrix)
+        self.angles = compute_numeric_angles(num_features)
+
+    @property
+    def shape(self) -> tuple:
+        n = self.content.shape[0]
+        return (n, n)
+
+    def __len__(self) -> int:
+        return self.content.shape[0]
+
+    def row(self, idx: int, weights: HybridWeights | None = None) -> np.ndarray:
+        """Menghitung satu baris Hybrid Similarity (satu sparse mat-vec + term numerik)."""
+        weights = weights or DEFAULT_WEIGHTS
+        content_row = self.content @ content_row_vector(self.content, idx)
+        return weights.content * content_row + weights.numeric * numeric_similarity(self.angles[idx], self.angles)
+
+    def rows(self, indices, weights: HybridWeights | None = None) -> np.ndarray:
+        """Menghitung beberapa baris Hybrid Similarity sekaligus."""
+        weights = weights or DEFAULT_WEIGHTS
+        indices = np.asarray(indices).ravel()
+        content_rows = self.content[indices] @ self.content.T
+        content_rows = content_rows.toarray() if sparse.issparse(content_rows) else content_rows
+        return weights.content * content_rows + weights.numeric * numeric_similarity(self.angles[indices], self.angles)
+
+    def neighbors(self, idx: int, k: int, weights: HybridWeights | None = None):
+        """Mengembalikan (indeks, skor) top-k tetangga produk idx, terurut menurun."""
+        row = self.row(idx, weights)
+        row[idx] = -np.inf
+        k = min(k, len(row) - 1)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        top_idx, top_scores = select_top_k(row[np.newaxis, :], k)
+        return top_idx[0], top_scores[0]
+
+    def neighbors_block(self, rows: np.ndarray, k: int, weights: HybridWeights | None = None):
+        """Versi batch dari neighbors: satu perkalian matriks untuk semua baris rows."""
+        block = self.rows(rows, weights)
+        block[np.arange(len(rows)), rows] = -np.inf
+        k = min(k, block.shape[1] - 1)
+        if k <= 0:
+            return np.empty((len(rows), 0), dtype=np.int64), np.empty((len(rows), 0))
+        return select_top_k(block, k)
+
+def build_lazy_hybrid_model(df: pd.DataFrame, tfidf_matrix) -> LazyHybridSimilarity:
+    """Menyiapkan Hybrid Model mode lazy: skor dihitung per query, bukan di awal."""
+    logger.info("Menyiapkan Hybrid Model (Lazy, on-demand row scoring)...")
+    return LazyHybridSimilarity(tfidf_matrix, df[NUMERIC_COLUMNS].values)
+
+def _topk_chunks(hybrid_sim, k: int, chunk_size: int):
+    """Menghasilkan (start, indeks top-k, skor top-k) per chunk baris, tanpa produk itu sendiri."""
+    n_products = hybrid_sim.shape[0]
+    for start in range(0, n_products, chunk_size):
+        stop = min(start + chunk_size, n_products)
+        if isinstance(hybrid_sim, NeighborGraph):
+            # Graf tetangga sudah terurut & tanpa produk itu sendiri
+            yield start, np.asarray(hybrid_sim.indices[start:stop, :k]), np.asarray(hybrid_sim.scores[start:stop, :k])
+            continue
+
+        if isinstance(hybrid_sim, LazyHybridSimilarity):
+            block = hybrid_sim.rows(np.arange(start, stop))
+        else:
+            block = np.array(hybrid_sim[start:stop], dtype=np.float64)
+        rows = np.arange(stop - start)
+        block[rows, rows + start] = -np.inf
+        yield (start, *select_top_k(block, k))
+
+def calculate_evaluation_metrics(df: pd.DataFrame, hybrid_sim, top_k: int = 5, chunk_size: int = 1024) -> dict:
+    """Menghitung rata-rata similarity top-K untuk evaluasi model global (vektorisasi per chunk).
+
+    Mendukung matriks padat, NeighborGraph, dan LazyHybridSimilarity. Metrik tambahan:
+    coverage katalog, rasio tetangga satu kategori, dan rata-rata similarity per kategori.
+    """
     n_products = hybrid_sim.shape[0]
     
     # Pastikan ukuran df dan hybrid_sim sama
     if len(df) != n_products:
         df = df.iloc[:n_products].reset_index(drop=True)
-        
-    for idx in range(n_products):
-        # Ambil 5 produk paling mirip (diurutkan [1:6])
-        sim_scores = sorted(list(enumerate(hybrid_sim[idx])), key=lambda x: x[1], reverse=True)[1:6]
-        if sim_scores:
-            avg_sim = np.mean([s[1] for s in sim_scores])
-            results.append(avg_sim)
-        else:
-            results.append(0)
-    
-    df_similarity_eval = pd.DataFrame(results, columns=['Average_Similarity'])
-    
-    return {
-        "avg_topk_similarity": df_similarity_eval["Average_Similarity"].mean(),
-        "global_mean_similarity": df_similarity_eval["Average_Similarity"].mean()
-    }
\ No newline at end of file
+
+    k = min(top_k, n_products - 1)
+    if isinstance(hybrid_sim, NeighborGraph):
+        k = min(k, hybrid_sim.top_k)
+    if k <= 0:
+        return {"avg_topk_similarity": 0.0, "global_mean_similarity": 0.0}
+
+    categories = pd.factorize(df['Category'])[0] if 'Category' in df.columns else None
+    avg_sim = np.empty(n_products, dtype=np.float64)
+    recommended = np.zeros(n_products, dtype=bool)
+    same_category = 0
+
+    # Satu pass: rata-rata top-k, coverage, dan kesamaan kategori
+    for start, top_idx, top_scores in _topk_chunks(hybrid_sim, k, chunk_size):
+        avg_sim[start:start + len(top_scores)] = top_scores.mean(axis=1)
+        recommended[top_idx.ravel()] = True
+        if categories is not None:
+            own = categories[start:start + len(top_idx), np.newaxis]
+            same_category += int((categories[top_idx] == own).sum())
+
+    metrics = {
+        "avg_topk_similarity": float(avg_sim.mean()),
+        "global_mean_similarity": float(avg_sim.mean()),
+        "catalog_coverage": float(recommended.mean()),
+    }
+    if categories is not None:
+        metrics["same_category_ratio"] = same_category / (n_products * k)
+        per_category = pd.Series(avg_sim).groupby(df['Category'].values).mean()
+        metrics["category_mean_similarity"] = {str(cat): float(val) for cat, val in per_category.items()}
+    return metrics
\ No newline at end of file
@@ -3,16 +3,22 @@
 import pandas as pd
 import numpy as np
 import logging
+import zlib
 
 logger = logging.getLogger(__name__)
 
-def clean_and_handle_missing_values(df: pd.DataFrame) -> pd.DataFrame:
-    """Melakukan pembersihan dan penanganan missing value."""
+def clean_and_handle_missing_values(df: pd.DataFrame, reference: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Melakukan pembersihan dan penanganan missing value.
+
+    reference: katalog yang sudah bersih (mis. artifact.df saat update inkremental); jika diisi, Rating kosong/0
+    diisi rata-rata per Brand lalu rata-rata global katalog tersebut, bukan statistik batch df saja.
+    """
     df = df.copy()
     logger.info("Memulai Pre-Processing dan Data Cleaning...")
     
     # 1. Handling Missing Value (dengan nilai default/rata-rata)
-    df['Rating'] = df['Rating'].fillna(df['Rating'].mean())
+    if reference is None:
+        df['Rating'] = df['Rating'].fillna(df['Rating'].mean())
     df['ReviewCount'] = df['ReviewCount'].fillna(0)
     df['Description'] = df['Description'].fillna('')
     df['Tags'] = df['Tags'].fillna('')
@@ -29,10 +35,155 @@ def clean_and_handle_missing_values(df: pd.DataFrame) -> pd.DataFrame:
 
     # 3. Pembersihan Rating Lanjutan
     df['Rating'] = df['Rating'].replace(0, np.nan)
+    if reference is not None:
+        # Rata-rata per Brand & global diambil dari katalog referensi
+        df['Rating'] = df['Rating'].fillna(df['Brand'].map(reference.groupby('Brand')['Rating'].mean()))
+        df['Rating'] = df['Rating'].fillna(reference['Rating'].mean())
     # Isi NaN dengan rata-rata rating per Brand
     df['Rating'] = df.groupby('Brand')['Rating'].transform(lambda x: x.fillna(x.mean()))
     # Isi NaN yang tersisa dengan rata-rata global
     df['Rating'] = df['Rating'].fillna(df['Rating'].mean())
 
     logger.info(f"Pembersihan selesai. Ukuran data: {df.shape}")
-    return df
\ No newline at end of file
+    return df
+
+def _text_shingles(text: str, size: int) -> set:
+    """Shingle karakter (size-gram) dari teks yang dinormalisasi (lowercase, spasi tunggal)."""
+    text = ' '.join(text.lower().split())
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def _minhash_signatures(texts, num_perm: int, shingle_size: int, random_state: int) -> np.ndarray:
+    """Signature MinHash (N x num_perm) dari shingle crc32; baris tanpa teks bernilai 0 semua."""
+    rng = np.random.RandomState(random_state)
+    # Permutasi (a*x + b) mod prime Mersenne 2^61-1 (overflow uint64 disengaja, seperti MinHash standar)
+    prime = np.uint64((1 << 61) - 1)
+    a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+
+    signatures = np.zeros((len(texts), num_perm), dtype=np.uint64)
+    for row, text in enumerate(texts):
+        shingles = _text_shingles(text, shingle_size)
+        if not shingles:
+            continue
+        hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+        with np.errstate(over='ignore'):
+            signatures[row] = ((a[:, np.newaxis] * hashes[np.newaxis, :] + b[:, np.newaxis]) % prime).min(axis=1)
+    return signatures
+
+def collapse_near_duplicates(df: pd.DataFrame, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                             shingle_size: int = 5, random_state: int = 42) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Menggabungkan listing yang hampir identik (Name + Description) menjadi satu produk kanonik.
+
+    Kandidat dicari dengan MinHash + LSH banding per Brand, lalu diverifikasi dengan estimasi Jaccard
+    >= threshold. Produk kanonik tiap cluster = ReviewCount terbanyak (seri: baris pertama).
+    Mengembalikan (df kanonik, tabel varian: Name & ProdID varian -> produk kanoniknya).
+    """
+    logger.info(f"Mendeteksi near-duplicate (MinHash, threshold={threshold})...")
+    texts = (df['Name'] + ' ' + df['Description']).tolist()
+    signatures = _minhash_signatures(texts, num_perm, shingle_size, random_state)
+    has_text = np.array([bool(t.strip()) for t in texts])
+    brands = df['Brand'].astype(str).values
+    rows_per_band = num_perm // bands
+
+    # 1. Union-find atas pasangan kandidat dari bucket LSH
+    parent = np.arange(len(df))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        band_sig = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        buckets = {}
+        for row in np.flatnonzero(has_text):
+            buckets.setdefault((brands[row], band_sig[row].tobytes()), []).append(row)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # Verifikasi terhadap anggota pertama bucket (estimasi Jaccard dari signature penuh)
+            head, rest = members[0], np.array(members[1:])
+            agreement = (signatures[rest] == signatures[head]).mean(axis=1)
+            for row in rest[agreement >= threshold]:
+                root_a, root_b = find(head), find(row)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    # 2. Pilih produk kanonik per cluster
+    clusters = np.array([find(i) for i in range(len(df))])
+    order = np.lexsort((np.arange(len(df)), -df['ReviewCount'].values))
+    canonical_of_cluster = {}
+    for row in order:
+        canonical_of_cluster.setdefault(clusters[row], row)
+    canonical = np.array([canonical_of_cluster[c] for c in clusters])
+
+    is_variant = canonical != np.arange(len(df))
+    id_cols = ['Name', 'ProdID'] if 'ProdID' in df.columns else ['Name']
+    variants = df.loc[is_variant, id_cols].reset_index(drop=True)
+    canonical_rows = df.iloc[canonical[is_variant]][id_cols].reset_index(drop=True)
+    for col in id_cols:
+        variants[f'Canonical{col}'] = canonical_rows[col]
+
+    df = df[~is_variant].reset_index(drop=True)
+    logger.info(f"Near-duplicate digabung: {len(variants)} varian -> ukuran data: {df.shape}")
+    return df, variants
+
+def match_near_duplicates(df: pd.DataFrame, catalog: pd.DataFrame, threshold: float = 0.8, num_perm: int = 64,
+                          bands: int = 16, shingle_size: int = 5, random_state: int = 42) -> np.ndarray:
+    """Untuk tiap baris df: indeks baris catalog yang near-duplicate (Brand sama, estimasi Jaccard >= threshold).
+
+    Parameter MinHash sama dengan collapse_near_duplicates; baris tanpa pasangan bernilai -1.
+    """
+    texts = (df['Name'] + ' ' + df['Description']).tolist()
+    catalog_texts = (catalog['Name'] + ' ' + catalog['Description']).tolist()
+    signatures = _minhash_signatures(texts, num_perm, shingle_size, random_state)
+    catalog_signatures = _minhash_signatures(catalog_texts, num_perm, shingle_size, random_state)
+    brands, catalog_brands = df['Brand'].astype(str).values, catalog['Brand'].astype(str).values
+    rows_per_band = num_perm // bands
+
+    # 1. Bucket LSH katalog per (Brand, band)
+    buckets = {}
+    for row in (i for i, text in enumerate(catalog_texts) if text.strip()):
+        for band in range(bands):
+            band_sig = catalog_signatures[row, band * rows_per_band:(band + 1) * rows_per_band]
+            buckets.setdefault((band, catalog_brands[row], band_sig.tobytes()), []).append(row)
+
+    # 2. Kandidat tiap baris baru dari bucket yang sama, diverifikasi dengan signature penuh
+    matches = np.full(len(df), -1, dtype=np.int64)
+    for row in (i for i, text in enumerate(texts) if text.strip()):
+        candidates = set()
+        for band in range(bands):
+            band_sig = signatures[row, band * rows_per_band:(band + 1) * rows_per_band]
+            candidates.update(buckets.get((band, brands[row], band_sig.tobytes()), ()))
+        if not candidates:
+            continue
+        candidates = np.array(sorted(candidates))
+        agreement = (catalog_signatures[candidates] == signatures[row]).mean(axis=1)
+        if agreement.max() >= threshold:
+            matches[row] = candidates[np.argmax(agreement)]
+    return matches
+
+def collapse_into_catalog(df: pd.DataFrame, catalog: pd.DataFrame, threshold: float = 0.8,
+                          **minhash_params) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Menggabungkan listing baru yang near-duplicate ke produk kanonik katalog (update inkremental).
+
+    Baris yang cocok dengan katalog menjadi varian produk katalog tersebut; sisanya di-dedup antar sesamanya
+    dengan collapse_near_duplicates. Mengembalikan (df tanpa varian, tabel varian baru).
+    """
+    matches = match_near_duplicates(df, catalog, threshold=threshold, **minhash_params)
+    matched = matches >= 0
+    id_cols = ['Name', 'ProdID'] if 'ProdID' in df.columns and 'ProdID' in catalog.columns else ['Name']
+    variants = df.loc[matched, id_cols].reset_index(drop=True)
+    canonical_rows = catalog.iloc[matches[matched]][id_cols].reset_index(drop=True)
+    for col in id_cols:
+        variants[f'Canonical{col}'] = canonical_rows[col]
+
+    df = df[~matched].reset_index(drop=True)
+    batch_variants = variants.iloc[:0]
+    if len(df):
+        df, batch_variants = collapse_near_duplicates(df, threshold=threshold, **minhash_params)
+    logger.info(f"Listing baru: {len(variants)} varian produk katalog, {len(batch_variants)} varian antar listing.")
+    return df, pd.concat([variants, batch_variants], ignore_index=True)
\ No newline at end of file
@@ -0,0 +1,158 @@
+# src/recommendation_cache.py
+
+import pandas as pd
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+from src.modelling import HybridWeights, DEFAULT_WEIGHTS
+from src.search_index import RecommendationFilter
+
+logger = logging.getLogger(__name__)
+
+class RecommendationCache:
+    """Cache LRU thread-safe di depan IntegratedRecommender.get_recommendations & search.
+
+    Kunci: (metode, query ternormalisasi, n, weights, columns, compact, filters). Entri kedaluwarsa setelah ttl detik.
+    Jika version_source & loader diisi, versi artefak terbaru dicek paling sering tiap check_interval detik;
+    saat berbeda dari recommender.model_version, recommender baru dimuat lewat loader(versi) lalu cache dikosongkan.
+    Atribut lain (df, hybrid_sim, ...) diteruskan ke recommender, sehingga bisa dipakai sebagai pengganti langsung.
+    """
+
+    def __init__(self, recommender, maxsize: int = 1024, ttl: float | None = 600, clock=time.monotonic,
+                 version_source=None, loader=None, check_interval: float = 60):
+        # version_source(): versi artefak saat ini (mis. artifact_version(DATA_FILE_PATH))
+        # loader(versi): recommender baru untuk versi tersebut (mis. dari load_or_build_artifact)
+        if (version_source is None) != (loader is None):
+            raise ValueError("version_source dan loader harus diisi bersamaan.")
+        self.recommender = recommender
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.version_source = version_source
+        self.loader = loader
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = getattr(recommender, 'model_version', None)
+        self._last_check = clock()
+        self._reloading = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def __getattr__(self, name):
+        # Dipanggil hanya jika atribut tidak ada; cegah rekursi saat recommender belum terpasang (copy/unpickle)
+        if name == 'recommender' or name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.recommender, name)
+
+    def current(self):
+        """Recommender aktif setelah versi artefak dicek (dibatasi check_interval).
+
+        UI sebaiknya membaca katalog & metrik (df, metrics) dari objek ini per render, agar tetap sesuai
+        dengan recommender yang melayani query setelah pergantian versi.
+        """
+        self._maybe_reload()
+        with self._lock:
+            return self.recommender
+
+    def set_recommender(self, recommender):
+        """Mengganti recommender (mis. setelah artefak baru dimuat); cache dikosongkan jika versinya berbeda."""
+        with self._lock:
+            self.recommender = recommender
+            self._check_version()
+
+    def _check_version(self):
+        version = getattr(self.recommender, 'model_version', None)
+        if version != self._version:
+            logger.info(f"Versi model berubah ({self._version} -> {version}); cache rekomendasi dikosongkan.")
+            self._entries.clear()
+            self._version = version
+            self.reloads += 1
+
+    def _maybe_reload(self):
+        """Cek versi artefak (dibatasi check_interval); jika berubah, muat recommender baru dan pasang."""
+        if self.version_source is None:
+            return
+        with self._lock:
+            # Hanya satu thread yang memeriksa/memuat; thread lain tetap dilayani recommender lama
+            if self._reloading or self.clock() - self._last_check < self.check_interval:
+                return
+            self._reloading = True
+            self._last_check = self.clock()
+
+        try:
+            version = self.version_source()
+            if version != self._version:
+                logger.info(f"Artefak versi {version} terdeteksi; memuat recommender baru...")
+                self.set_recommender(self.loader(version))
+        except Exception as e:
+            # Gagal memuat versi baru tidak boleh menghentikan layanan: tetap pakai recommender lama
+            logger.warning(f"Gagal memeriksa/memuat versi model terbaru: {e}")
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def get_recommendations(self, product_name: str, n: int = 5, weights: HybridWeights | None = None,
+                            columns: list[str] | None = None, compact: bool = False,
+                            filters: RecommendationFilter | None = None):
+        """Sama seperti IntegratedRecommender.get_recommendations, tetapi hasilnya di-cache."""
+        return self._cached('recommend', product_name, n, weights, columns, compact, filters)
+
+    def search(self, query: str, n: int = 5, weights: HybridWeights | None = None,
+               columns: list[str] | None = None, compact: bool = False, filters: RecommendationFilter | None = None):
+        """Sama seperti IntegratedRecommender.search, tetapi hasilnya di-cache."""
+        return self._cached('search', query, n, weights, columns, compact, filters)
+
+    def _cached(self, method: str, query: str, n: int, weights: HybridWeights | None,
+                columns: list[str] | None, compact: bool, filters: RecommendationFilter | None):
+        self._maybe_reload()
+        key = (method, query.strip().lower(), n, weights or DEFAULT_WEIGHTS, tuple(columns) if columns else None, compact,
+               filters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or self.clock() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(entry[1])
+            self.misses += 1
+            version, recommender = self._version, self.recommender
+
+        # Dihitung di luar lock agar query lain tidak ikut menunggu
+        compute = recommender.get_recommendations if method == 'recommend' else recommender.search
+        result = compute(query, n, weights, columns, compact, filters)
+
+        with self._lock:
+            # Jangan simpan hasil dari versi model yang sudah diganti saat komputasi berjalan
+            if version == self._version:
+                self._entries[key] = (self.clock(), result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return self._copy(result)
+
+    @staticmethod
+    def _copy(result):
+        # DataFrame dikopi agar pemanggil tidak mengubah isi cache (RecommendationResult dibagi apa adanya)
+        return result.copy() if isinstance(result, pd.DataFrame) else result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Statistik cache: hits, misses, hit_rate, evictions, size, reloads."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'reloads': self.reloads,
+            }
\ No newline at end of file
@@ -0,0 +1,147 @@
+# src/search_index.py
+
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _trigrams(text: str) -> set:
+    """Trigram karakter dengan padding spasi, agar kata pendek tetap punya trigram."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameSearchIndex:
+    """Inverted index trigram atas nama produk ternormalisasi, dibangun sekali saat startup.
+
+    names diberikan berurutan sesuai baris katalog, sehingga ID nama terkecil = baris pertama.
+    Selain posting trigram (substring), disimpan histogram karakter per nama untuk fuzzy match.
+    """
+
+    def __init__(self, names: list[str]):
+        self.names = list(names)
+
+        postings = {}
+        for name_id, name in enumerate(self.names):
+            for gram in _trigrams(name):
+                postings.setdefault(gram, []).append(name_id)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+        # Histogram karakter (N x alfabet, sparse CSC) -> quick_ratio seluruh katalog dihitung sekaligus
+        self.lengths = np.array([len(name) for name in self.names], dtype=np.int64)
+        self.char_ids = {ch: i for i, ch in enumerate(sorted({ch for name in self.names for ch in name}))}
+        codes = np.fromiter((self.char_ids[ch] for name in self.names for ch in name), dtype=np.int64,
+                            count=int(self.lengths.sum()))
+        rows = np.repeat(np.arange(len(self.names)), self.lengths)
+        self.char_counts = sparse.csc_matrix((np.ones(len(codes), dtype=np.int32), (rows, codes)),
+                                             shape=(len(self.names), len(self.char_ids)))
+        logger.info(f"Indeks trigram nama dibangun: {len(self.names)} nama, {len(self.postings)} trigram.")
+
+    def _quick_ratios(self, query: str) -> np.ndarray:
+        """SequenceMatcher.quick_ratio query terhadap setiap nama (batas atas ratio), tervektorisasi."""
+        counts = {}
+        for ch in query:
+            if ch in self.char_ids:
+                counts[self.char_ids[ch]] = counts.get(self.char_ids[ch], 0) + 1
+        if counts:
+            cols = np.fromiter(counts, dtype=np.int64, count=len(counts))
+            query_counts = np.fromiter(counts.values(), dtype=np.int32, count=len(counts))
+            matches = np.minimum(self.char_counts[:, cols].toarray(), query_counts).sum(axis=1)
+        else:
+            matches = np.zeros(len(self.names), dtype=np.int64)
+        total = self.lengths + len(query)
+        # Rumus sama dengan difflib (2.0 * matches / length), dua string kosong = 1.0
+        return np.where(total > 0, 2.0 * matches / np.maximum(total, 1), 1.0)
+
+    def first_containing(self, query: str) -> str | None:
+        """Nama pertama (ID terkecil) yang memuat query sebagai substring literal (tanpa regex)."""
+        if len(query) < 3:
+            # Query terlalu pendek untuk trigram: scan linear (tetap tanpa regex)
+            return next((name for name in self.names if query in name), None)
+
+        # 1. Irisan posting semua trigram query (dimulai dari posting terpendek)
+        lists = []
+        for gram in {query[i:i + 3] for i in range(len(query) - 2)}:
+            if gram not in self.postings:
+                return None
+            lists.append(self.postings[gram])
+        lists.sort(key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            if len(candidates) == 0:
+                return None
+
+        # 2. Verifikasi substring literal, urut dari ID terkecil
+        return next((self.names[i] for i in candidates if query in self.names[i]), None)
+
+    def closest(self, query: str, cutoff: float = 0.4) -> str | None:
+        """Nama paling mirip (SequenceMatcher.ratio >= cutoff), identik dengan difflib.get_close_matches n=1.
+
+        quick_ratio adalah batas atas ratio, sehingga nama dengan quick_ratio < cutoff aman dilewati.
+        Sisanya dinilai urut dari quick_ratio terbesar dan berhenti begitu batasnya < skor terbaik.
+        """
+        bounds = self._quick_ratios(query)
+        candidates = np.flatnonzero(bounds >= cutoff)
+        candidates = candidates[np.argsort(-bounds[candidates], kind='stable')]
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        best = None
+        for name_id in candidates:
+            if best is not None and bounds[name_id] < best[0]:
+                break
+            name = self.names[name_id]
+            matcher.set_seq1(name)
+            score = matcher.ratio()
+            # Seri diputus seperti get_close_matches (nilai (skor, nama) terbesar)
+            if score >= cutoff and (best is None or (score, name) > best):
+                best = (score, name)
+        return None if best is None else best[1]
+
+@dataclass(frozen=True)
+class RecommendationFilter:
+    """Filter rekomendasi: Brand / Category persis & batas bawah Rating (None = tidak difilter)."""
+    brand: str | None = None
+    category: str | None = None
+    min_rating: float | None = None
+
+    @property
+    def is_empty(self) -> bool:
+        return self.brand is None and self.category is None and self.min_rating is None
+
+class CatalogFilterIndex:
+    """Indeks filter katalog yang dibangun sekali: array baris terurut per Brand & Category,
+    serta urutan Rating untuk mencari rentang rating dengan binary search."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_products = len(df)
+        self.brand_rows = {
+            brand: np.asarray(rows, dtype=np.int64) for brand, rows in df.groupby('Brand', sort=False).indices.items()
+        }
+        self.category_rows = {
+            category: np.asarray(rows, dtype=np.int64)
+            for category, rows in df.groupby('Category', sort=False).indices.items()
+        }
+        ratings = df['Rating'].to_numpy(dtype=np.float64)
+        self.rating_order = np.argsort(ratings, kind='stable')
+        self.sorted_ratings = ratings[self.rating_order]
+
+    def mask(self, filters: RecommendationFilter) -> np.ndarray:
+        """Bitset (array bool N) produk yang lolos semua filter."""
+        mask = np.ones(self.n_products, dtype=bool)
+        empty = np.empty(0, dtype=np.int64)
+        for value, index in ((filters.brand, self.brand_rows), (filters.category, self.category_rows)):
+            if value is not None:
+                allowed = np.zeros(self.n_products, dtype=bool)
+                allowed[index.get(value, empty)] = True
+                mask &= allowed
+        if filters.min_rating is not None:
+            start = np.searchsorted(self.sorted_ratings, filters.min_rating, side='left')
+            allowed = np.zeros(self.n_products, dtype=bool)
+            allowed[self.rating_order[start:]] = True
+            mask &= allowed
+        return mask
\ No newline at end of file